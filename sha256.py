@@ -1,5 +1,13 @@
-import math
-import copy
+import argparse
+import collections
+import contextlib
+import mmap
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
 
 
 class PreProcessData:
@@ -14,8 +22,13 @@ class PreProcessData:
     WORD_SIZE = 32
 
     def __init__(self, data):
-        """Initialize the data to be stored.  Set pre-processed string to none"""
+        """Initialize the data to be stored.  Set pre-processed string to none.
+        data can be a string (hashed as its UTF-8 encoding) or any bytes-like object (bytes, bytearray, memoryview,
+        array, mmap...), which is viewed through a memoryview rather than copied"""
         self._data = data
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.message = memoryview(data).cast('B')
         self.padded = None
         # initialize preprocessed data as an empty array
         self.preprocessed = []
@@ -26,11 +39,8 @@ class PreProcessData:
         return self._data
 
     def convert_to_binary(self):
-        """accepts string and integer inputs. Converts input to binary string"""
-        try:
-            return ''.join(format(ord(x), '08b') for x in self.data)
-        except:
-            print('Currently accepts string values only')
+        """Converts the message bytes to a binary string, 8 bits per byte"""
+        return ''.join(format(x, '08b') for x in self.message)
 
     def pad_data(self):
         """
@@ -41,59 +51,79 @@ class PreProcessData:
         at the end of the message, giving us final message block of 512 bits.
         4) Block is divided into 16 words of 32 bits each.
         """
+        profiler = _profiler
+        if profiler is not None:
+            started = time.perf_counter()
+        binary = self.convert_to_binary()
         # append 1 to the end ot the input"""
-        appended_1 = str(self.convert_to_binary()) + "1"
+        appended_1 = binary + "1"
         # Pad with 0’s until data is a multiple of 512, less 64 bits
         num_zeroes = (512 + 448 - (len(appended_1) % 512)) % 512
         padded = appended_1 + "0" * num_zeroes
         # Append 64 bits to the end, where the 64 bits are a big-endian integer representing the length of the original
         # input in binary.  Use zfill to left pad with 0s until length is 64
-        bin_len_input = format(len(self.convert_to_binary()), "b")
+        bin_len_input = format(len(binary), "b")
         sixty_four_bit_binary = str(bin_len_input).zfill(self.BLOCK_SIZE)
         # Add the padded binary string with the 64 bit string representing length of original input
         self.padded = padded + sixty_four_bit_binary
+        if profiler is not None:
+            profiler.record('pad_data', time.perf_counter() - started, nbytes=len(self.message))
         return self.padded
 
     def parse(self):
         """Parse data into equal lengths of 32"""
         # divide string into lengths of 32 (512/32 should give us 16)
         self.pad_data()
+        profiler = _profiler
+        if profiler is not None:
+            started = time.perf_counter()
+        self.preprocessed = []
         # divide into N 512 bit blocks
         divide_512 = [self.padded[i:i + 512] for i in range(0, len(self.padded), 512)]
         for block in divide_512:
-            divide_32 = [self.padded[i:i + self.WORD_SIZE] for i in range(0, len(block),self.WORD_SIZE)]
+            divide_32 = [block[i:i + self.WORD_SIZE] for i in range(0, len(block), self.WORD_SIZE)]
         # Add words initialized to zero so we have 64 words, such that we have an array w[0…63] to create out
         # "pre-message-schedule"
             divide_32.extend("0" * self.WORD_SIZE for _ in range(self.BLOCK_SIZE - len(divide_32)))
             self.preprocessed.append(divide_32)
+        if profiler is not None:
+            profiler.record('parse', time.perf_counter() - started)
         return self.preprocessed
 
+    def message_blocks(self):
+        """
+        Byte-oriented version of pad_data and parse: yield each 512-bit block of the padded message as a tuple of its
+        16 words (big-endian 32-bit ints).  Full blocks are read straight from the message buffer, only the final
+        partial block is copied and padded.
+        """
+        full = len(self.message) - len(self.message) % self.BLOCK_SIZE
+        for offset in range(0, full, self.BLOCK_SIZE):
+            yield struct.unpack_from('>16I', self.message, offset)
+        tail = bytes(self.message[full:]) + padding(len(self.message))
+        for offset in range(0, len(tail), self.BLOCK_SIZE):
+            yield struct.unpack_from('>16I', tail, offset)
+
+    def binary_blocks(self):
+        """
+        Lazy, string version of parse: yield each 512-bit block of the padded message as a list of its 16 words
+        ('0'/'1' strings of 32 characters), one block at a time, so only the current block is held in memory
+        """
+        for words in self.message_blocks():
+            yield [format(x, '032b') for x in words]
+
     @staticmethod
     def hash_values():
         """Hard-coded constants that represent the first 32 bits of the fractional parts of the square roots of the first
-        8 primes: 2, 3, 5, 7, 11, 13, 17, 19"""
-        # get first 8 primes
-        first_eight_primes = get_primes(8)
-        # get fractional parts of square roots
-        fractional_square_roots = [math.modf(math.sqrt(n))[0] for n in first_eight_primes]
-        # multiply by 16^8 and take the floor
-        floor = [math.floor(n * 16 ** 8) for n in fractional_square_roots]
-        # convert to hexadecimal
-        first_eight_hash = [('0x' + (hex(x)[2:].zfill(8)), format(x, "b").zfill(32)) for x in floor]
-        return first_eight_hash
+        8 primes: 2, 3, 5, 7, 11, 13, 17, 19.  Computed once when the module is imported (see HASH_VALUES), returned as
+        (hex, binary) string pairs"""
+        return HASH_VALUE_STRINGS
 
     @staticmethod
     def round_constants():
         """Hard-coded constants that represent the first 32 bits of the fractional parts of the cube
-        roots of the first 64 primes (2 – 311)."""
-        first_sixty_four_primes = get_primes(64)
-        # get fractional parts of cube roots of first 64 primes
-        fractional_cube_roots = [math.modf(n ** (1. / 3.))[0] for n in first_sixty_four_primes]
-        # multiply by 16^8 and take the floor
-        floor = [math.floor(n * 16 ** 8) for n in fractional_cube_roots]
-        # convert to hexadecimal
-        first_sixty_four_hash = [('0x' + (hex(x)[2:].zfill(8)), format(x, "b").zfill(32)) for x in floor]
-        return first_sixty_four_hash
+        roots of the first 64 primes (2 – 311).  Computed once when the module is imported (see ROUND_CONSTANTS),
+        returned as (hex, binary) string pairs"""
+        return ROUND_CONSTANT_STRINGS
 
 
 class SHA256:
@@ -147,66 +177,89 @@ class SHA256:
         e_1 = xor_(xor_(rotate_right(x, 6), rotate_right(x, 11)), rotate_right(x, 25))
         return e_1
 
-    def block_decomposition(self):
+    def expand(self, block):
         """
-        Prepare the message schedule (aka mutate the zeroes from pre-message-schedule produced in preprocessing):
-        For i from w[16…63]:
+        Yield the 64 words w[0…63] of the message schedule of one block (16 words), computing each word only when it is
+        needed by its round.  w[i] depends on nothing older than w[i-16], so the schedule is kept in a circular buffer of
+        16 words, w[i] overwriting w[i-16]:
         s0 = (w[i-15] rightrotate 7) xor (w[i-15] rightrotate 18) xor (w[i-15] rightshift 3)
         s1 = (w[i- 2] rightrotate 17) xor (w[i- 2] rightrotate 19) xor (w[i- 2] rightshift 10)
         w[i] = w[i-16] + s0 + w[i-7] + s1 """
+        w = list(block)
+        yield from w
+        for i in range(16, 64):
+            s0 = self.sigma_0(w[(i - 15) & 15])
+            s1 = self.sigma_1(w[(i - 2) & 15])
+            w[i & 15] = binary_add(binary_add(binary_add(w[i & 15], s0), w[(i - 7) & 15]), s1)
+            yield w[i & 15]
+
+    def block_decomposition(self):
+        """
+        Prepare the message schedule (aka mutate the zeroes from pre-message-schedule produced in preprocessing): the
+        full 64 words of every block, see expand.  generate_hash does not use this, it expands each block as it is
+        compressed; the schedules are rebuilt on every call.
+        """
         # pre_process and parse the data to retrieve the message block
         preprocessed = self.preprocessed.parse()
+        profiler = _profiler
+        if profiler is not None:
+            started = time.perf_counter()
         # for each 512-bit block message schedule
-        for h in range(len(preprocessed)):
-            for i in range(16, len(preprocessed[0])):
-                # mutate the blocks of zeroes from w[16] to w[63] using s0 and s1 functions
-                s0 = self.sigma_0(preprocessed[h][i - 15])
-                s1 = self.sigma_1(preprocessed[h][i - 2])
-                preprocessed[h][i] = binary_add(binary_add(binary_add(preprocessed[h][i - 16], s0), preprocessed[h][i - 7]),
-                                              s1)
-            self.message_schedule.append(preprocessed[h])
+        self.message_schedule = [list(self.expand(block[:16])) for block in preprocessed]
+        if profiler is not None:
+            profiler.record('block_decomposition', time.perf_counter() - started)
         return self.message_schedule
 
-
-    def generate_hash(self):
-        """Run the compression loop to generate the final hash"""
-        # get hash_values and round_constants
+    def compress_block(self, h, block):
+        """Run the 64 rounds of the compression loop over one block (16 words) starting from hash values h, return the
+        hash values after the block"""
+        k = self.round_constants
+        hc = list(h)
+        # compression loop mutate the values of a...h, consuming the message schedule as it is expanded
+        for j, w in enumerate(self.expand(block)):
+            s1 = self.epsilon_1(hc[4])
+            ch1 = self.ch(hc[4], hc[5], hc[6])
+            val1 = binary_add(binary_add(hc[7], s1), ch1)
+            val2 = binary_add(k[j][1], w)
+            temp1 = binary_add(val1, val2)
+            s0 = self.epsilon_0(hc[0])
+            maj1 = self.maj(hc[0], hc[1], hc[2])
+            temp2 = binary_add(s0, maj1)
+            hc = [binary_add(temp1, temp2), hc[0], hc[1], hc[2], binary_add(hc[3], temp1), hc[4], hc[5], hc[6]]
+        # add final values hash values at end of each block to the hash values the block started from
+        return [binary_add(x, y) for x, y in zip(hc, h)]
+
+    def hexdigest(self):
+        """
+        Run the compression loop and return the final hash (in hex), without printing it.  This is a pipeline of
+        generators: blocks are read lazily from the message, and each one is expanded and compressed as soon as it is
+        produced, so memory use does not depend on the length of the message
+        """
         h = [x[1] for x in self.hash_values]
-        k = [x[1] for x in self.round_constants]
-        # keep a copy of original hash values
-        ho = copy.copy(h)
-        # get the message schedule
-        w = self.block_decomposition()
-        # print(hash_vals)
-        # compression loop mutate the values of a...h
-        for i in range(len(w)):
-            for j in range(0, 64):
-                # copy list for each loop round
-                hc = copy.copy(h)
-                s1 = self.epsilon_1(hc[4])
-                ch1 = self.ch(hc[4], hc[5], hc[6])
-                val1 = binary_add(binary_add(hc[7], s1), ch1)
-                val2 = binary_add(k[j], w[i][j])
-                temp1 = binary_add(val1, val2)
-                # print(temp1)
-                s0 = self.epsilon_0(hc[0])
-                maj1 = self.maj(hc[0], hc[1], hc[2])
-                temp2 = binary_add(s0, maj1)
-                # print(temp2)
-                h[7] = hc[6]
-                h[6] = hc[5]
-                h[5] = hc[4]
-                h[4] = binary_add(hc[3], temp1)
-                h[3] = hc[2]
-                h[2] = hc[1]
-                h[1] = hc[0]
-                h[0] = binary_add(temp1, temp2)
-        # add final values hash values at end of iteration to original hash values
-        compressed_h = [binary_add(h[x], ho[x]) for x in range(len(h))]
+        profiler = _profiler
+        if profiler is not None:
+            parsing = compressing = 0.0
+            blocks = 0
+            started = time.perf_counter()
+        for block in self.preprocessed.binary_blocks():
+            if profiler is not None:
+                parsed = time.perf_counter()
+                parsing += parsed - started
+            h = self.compress_block(h, block)
+            if profiler is not None:
+                started = time.perf_counter()
+                compressing += started - parsed
+                blocks += 1
+        if profiler is not None:
+            parsing += time.perf_counter() - started
+            profiler.record('parse', parsing)
+            profiler.record('compression', compressing, blocks, len(self.preprocessed.message))
         # convert hash values to hex and concatenate them
-        hex_vals = [(hex(int(x, 2))[2:]).zfill(8) for x in compressed_h]
-        digest = ''.join(hex_vals)
-        # return the final hash output (in hex)
+        return ''.join(format(int(x, 2), '08x') for x in h)
+
+    def generate_hash(self):
+        """Generate the final hash with hexdigest, print it and return it (in hex)"""
+        digest = self.hexdigest()
         print(digest)
         return digest
 
@@ -300,3 +353,622 @@ def binary_add(a, b):
     # binary addition is calculated modulo 2^32
     return sum.zfill(length)[-32:]
 
+
+# 32-bit words are kept as native Python ints in the integer engine, so every addition and left rotation is masked
+# back down to 32 bits
+MASK_32 = 0xFFFFFFFF
+
+
+def integer_root(n, k):
+    """Return the k-th root of the integer n rounded down, computed exactly with Newton's method (no floats)"""
+    if n < 2:
+        return n
+    # start from a power of 2 that is at least the root, Newton's method then decreases to the floor of the root
+    x = 1 << -(-n.bit_length() // k)
+    while True:
+        y = ((k - 1) * x + n // x ** (k - 1)) // k
+        if y >= x:
+            return x
+        x = y
+
+
+def fractional_bits(prime, k, bits=32):
+    """First bits (32) bits of the fractional part of the k-th root of prime: floor(prime^(1/k) * 2^bits) mod 2^bits"""
+    return integer_root(prime << (bits * k), k) & ((1 << bits) - 1)
+
+
+# initial hash values H(0) and round constants K, computed once at import from the first 64 primes
+PRIMES = tuple(get_primes(64))
+HASH_VALUES = tuple(fractional_bits(p, 2) for p in PRIMES[:8])
+ROUND_CONSTANTS = tuple(fractional_bits(p, 3) for p in PRIMES)
+# the same tables as (hex, binary) string pairs for PreProcessData and the string-based SHA256 class
+HASH_VALUE_STRINGS = tuple(('0x' + format(x, '08x'), format(x, '032b')) for x in HASH_VALUES)
+ROUND_CONSTANT_STRINGS = tuple(('0x' + format(x, '08x'), format(x, '032b')) for x in ROUND_CONSTANTS)
+
+
+# the 48 schedule words compress appends to a block for compress_buffer to overwrite
+_SCHEDULE_TAIL = (0,) * 48
+
+
+def compress(state, words, k=ROUND_CONSTANTS, mask=MASK_32):
+    """
+    Integer version of one pass of the compression loop in SHA256.generate_hash.  Accepts the 8 current hash values
+    and the first 16 words of a 512-bit message block (all ints) and returns the 8 updated hash values.
+    The message schedule is expanded to 64 words exactly as in SHA256.block_decomposition, and the working variables
+    a...h are plain local variables rather than a list of bit strings.
+    Rotations are done by doubling a word into 64 bits (x * 0x100000001 == x | x << 32): every right rotation of x is
+    then a single right shift of the doubled word.  The bits left above bit 32 never carry down into the low 32 bits,
+    so they are only masked off when a new word or working variable is stored.
+    The rounds themselves are in compress_buffer, which works in a preallocated schedule.
+    """
+    w = list(words)
+    w.extend(_SCHEDULE_TAIL)
+    return compress_buffer(state, w, k, mask)
+
+
+def compress_buffer(state, w, k=ROUND_CONSTANTS, mask=MASK_32):
+    """
+    compress working in place in a preallocated message schedule: w is a list of 64 ints whose first 16 are the
+    words of the block, w[16…63] are overwritten.  Returns the 8 updated hash values.
+    (k and mask are bound as default arguments so the loops only touch local variables)
+    """
+    # extend the 16 words into the 64 word message schedule
+    for i in range(16, 64):
+        x = w[i - 15]
+        y = w[i - 2]
+        xx = x * 0x100000001
+        yy = y * 0x100000001
+        # w[i] = w[i-16] + sigma_0(w[i-15]) + w[i-7] + sigma_1(w[i-2])
+        w[i] = ((w[i - 16] + w[i - 7] + ((xx >> 7) ^ (xx >> 18) ^ (x >> 3)) + ((yy >> 17) ^ (yy >> 19) ^ (y >> 10)))
+                & mask)
+    a, b, c, d, e, f, g, h = state
+    # compression loop mutate the values of a...h
+    for kj, wj in zip(k, w):
+        ee = e * 0x100000001
+        aa = a * 0x100000001
+        # temp1 = h + epsilon_1(e) + ch(e, f, g) + k[j] + w[j]
+        temp1 = h + kj + wj + ((ee >> 6) ^ (ee >> 11) ^ (ee >> 25)) + (g ^ (e & (f ^ g)))
+        # temp2 = epsilon_0(a) + maj(a, b, c)
+        temp2 = ((aa >> 2) ^ (aa >> 13) ^ (aa >> 22)) + ((a & b) | (c & (a | b)))
+        h, g, f, e, d, c, b, a = g, f, e, (d + temp1) & mask, c, b, a, (temp1 + temp2) & mask
+    # add the compressed chunk to the current hash values
+    return [(x + y) & mask for x, y in zip(state, (a, b, c, d, e, f, g, h))]
+
+
+class SHA256Int:
+    """
+    Same interface and digests as SHA256, but the eight working variables and the message schedule are native ints
+    masked to 32 bits instead of strings of '0'/'1' characters.  SHA256 and the string helpers remain the readable
+    reference implementation.  Blocks are compressed by the generated straight-line compression of sha256unrolled,
+    and a message of at most SHORT_MESSAGE bytes is padded and unpacked into its single block with struct.
+    """
+
+    def __init__(self, data):
+        # message blocks are read from the data as 32-bit int words when the hash is generated
+        self.preprocessed = PreProcessData(data)
+
+    def generate_hash(self):
+        """Run the integer compression function over every message block and return the final hash (in hex)"""
+        profiler = _profiler
+        if profiler is not None:
+            # while profiling, blocks go through compress so that its calls are counted like the other engines'
+            started = time.perf_counter()
+            compress_block = compress
+        else:
+            compress_block = _unrolled_compress or _load_unrolled()
+        message = self.preprocessed.message
+        if message.nbytes <= SHORT_MESSAGE:
+            h = compress_block(HASH_VALUES, _BLOCK_WORDS.unpack(bytes(message) + padding(message.nbytes)))
+            blocks = 1
+        else:
+            h = HASH_VALUES
+            blocks = 0
+            for block in self.preprocessed.message_blocks():
+                h = compress_block(h, block)
+                blocks += 1
+        if profiler is not None:
+            profiler.record('compression', time.perf_counter() - started, blocks, message.nbytes)
+        return _DIGEST.pack(*h).hex()
+
+
+# sha256unrolled.compress, imported by SHA256Int on first use (sha256unrolled imports this module)
+_unrolled_compress = None
+
+
+def _load_unrolled():
+    global _unrolled_compress
+    import sha256unrolled
+    _unrolled_compress = sha256unrolled.compress
+    return _unrolled_compress
+
+
+def padding(length):
+    """
+    Return the padding for a message of length bytes, as bytes: the 1 bit (0x80), 0's until the message is a
+    multiple of 512 bits less 64 bits, then the 64 bit big-endian length of the message in bits (see pad_data)
+    """
+    return b'\x80' + b'\x00' * ((55 - length) % 64) + struct.pack('>Q', (length * 8) & 0xFFFFFFFFFFFFFFFF)
+
+
+class SHA256Hash:
+    """
+    Incremental SHA-256 hasher with the same interface as hashlib.sha256: update() can be called any number of times,
+    digest() and hexdigest() do not change the state (and do not print), and copy() forks the state.
+    Only the 8 hash values, the message length and the last partial block (under 64 bytes) are kept, so memory does
+    not grow with the message.
+    """
+    name = 'sha256'
+    digest_size = 32
+    block_size = PreProcessData.BLOCK_SIZE
+    # checkpoint format: magic, version, the 8 hash values, the message length in bytes, then the partial block
+    # (message length % 64 bytes) and a CRC-32 of everything before it
+    CHECKPOINT_MAGIC = b'S256'
+    CHECKPOINT_VERSION = 1
+    CHECKPOINT_HEADER = struct.Struct('>4sB8IQ')
+
+    def __init__(self, data=b''):
+        self._h = HASH_VALUES
+        self._buffer = b''
+        self._length = 0
+        if data:
+            self.update(data)
+
+    def update(self, data):
+        """Hash the bytes-like data, continuing from the bytes already hashed"""
+        if isinstance(data, str):
+            raise TypeError('Strings must be encoded before hashing')
+        view = memoryview(data).cast('B')
+        profiler = _profiler
+        if profiler is not None:
+            started = time.perf_counter()
+        self._length += len(view)
+        h = self._h
+        start = 0
+        if self._buffer:
+            # top up the partial block left over from the last update first
+            start = self.block_size - len(self._buffer)
+            self._buffer += bytes(view[:start])
+            if len(self._buffer) < self.block_size:
+                if profiler is not None:
+                    profiler.record('update', time.perf_counter() - started, 0, len(view))
+                return
+            h = compress(h, struct.unpack('>16I', self._buffer))
+        # compress every full block straight from the input, only the remainder is copied into the buffer
+        end = len(view) - (len(view) - start) % self.block_size
+        for offset in range(start, end, self.block_size):
+            h = compress(h, struct.unpack_from('>16I', view, offset))
+        self._h = h
+        if profiler is not None:
+            # the blocks compressed are the topped up buffer (if there was one) and the full blocks of the input
+            profiler.record('update', time.perf_counter() - started, (end - start) // self.block_size
+                            + (start > 0), len(view))
+        self._buffer = bytes(view[end:])
+
+    def digest(self):
+        """Return the 32 byte digest of the data passed to update so far"""
+        profiler = _profiler
+        if profiler is not None:
+            started = time.perf_counter()
+        tail = self._buffer + padding(self._length)
+        h = self._h
+        for offset in range(0, len(tail), self.block_size):
+            h = compress(h, struct.unpack_from('>16I', tail, offset))
+        if profiler is not None:
+            profiler.record('digest', time.perf_counter() - started, len(tail) // self.block_size)
+        return struct.pack('>8I', *h)
+
+    def hexdigest(self):
+        """Return the digest as a string of 64 hex digits"""
+        return self.digest().hex()
+
+    @property
+    def length(self):
+        """Number of bytes hashed so far"""
+        return self._length
+
+    def checkpoint(self):
+        """
+        Return the state of the hasher (hash values, length and partial block) as at most 112 bytes, for resume() to
+        continue from, later or in another process
+        """
+        state = self.CHECKPOINT_HEADER.pack(self.CHECKPOINT_MAGIC, self.CHECKPOINT_VERSION, *self._h, self._length)
+        state += self._buffer
+        return state + struct.pack('>I', zlib.crc32(state))
+
+    @classmethod
+    def resume(cls, checkpoint):
+        """Return a hasher restored from checkpoint() bytes.  Raises ValueError if the checkpoint is not one, is
+        corrupt or has an unsupported version"""
+        checkpoint = bytes(checkpoint)
+        header = cls.CHECKPOINT_HEADER
+        if len(checkpoint) < header.size + 4 or not checkpoint.startswith(cls.CHECKPOINT_MAGIC):
+            raise ValueError('not a SHA256Hash checkpoint')
+        state = checkpoint[:-4]
+        if zlib.crc32(state) != struct.unpack('>I', checkpoint[-4:])[0]:
+            raise ValueError('corrupt SHA256Hash checkpoint')
+        _, version, *h, length = header.unpack_from(state)
+        if version != cls.CHECKPOINT_VERSION:
+            raise ValueError(f'unsupported SHA256Hash checkpoint version {version}')
+        buffer = state[header.size:]
+        if len(buffer) != length % cls.block_size:
+            raise ValueError('corrupt SHA256Hash checkpoint')
+        hasher = cls.__new__(cls)
+        hasher._h = tuple(h)
+        hasher._buffer = buffer
+        hasher._length = length
+        return hasher
+
+    def copy(self):
+        """Return a copy of the hasher.  The hash values and buffer are immutable so they are shared, not copied"""
+        other = SHA256Hash.__new__(SHA256Hash)
+        other._h = self._h
+        other._buffer = self._buffer
+        other._length = self._length
+        return other
+
+
+# longest message that pads to a single block: 55 bytes, the 0x80 byte and the 8 byte length
+SHORT_MESSAGE = PreProcessData.BLOCK_SIZE - 9
+_BLOCK_WORDS = struct.Struct('>16I')
+_DIGEST = struct.Struct('>8I')
+_ZEROS = bytes(SHORT_MESSAGE)
+
+
+def _pad_short(block, view):
+    """Write the message view (at most SHORT_MESSAGE bytes, format 'B') and its padding into the 64 byte block"""
+    n = view.nbytes
+    block[:n] = view
+    block[n] = 0x80
+    block[n + 1:56] = _ZEROS[n:]
+    struct.pack_into('>Q', block, 56, n * 8)
+
+
+def hash_block(data):
+    """
+    Return the 32 byte digest of a bytes-like message of at most SHORT_MESSAGE bytes, which pads to one block: the
+    block is padded in a bytearray and compressed directly, without a hasher object
+    """
+    view = memoryview(data).cast('B')
+    if view.nbytes > SHORT_MESSAGE:
+        raise ValueError(f'hash_block takes at most {SHORT_MESSAGE} bytes, not {view.nbytes}')
+    block = bytearray(64)
+    _pad_short(block, view)
+    return _DIGEST.pack(*compress(HASH_VALUES, _BLOCK_WORDS.unpack(block)))
+
+
+def hash_many(messages):
+    """
+    Return the list of 32 byte digests of an iterable of bytes-like messages, in order.  Messages of at most
+    SHORT_MESSAGE bytes take the single-block path: written into one block buffer and compressed in one message
+    schedule, both allocated per call, with no hasher object per message.  Longer messages are hashed with SHA256Hash
+    """
+    profiler = _profiler
+    if profiler is not None:
+        started = time.perf_counter()
+    block = bytearray(64)
+    w = [0] * 64
+    unpack = _BLOCK_WORDS.unpack
+    pack = _DIGEST.pack
+    compress_block = compress_buffer
+    digests = []
+    blocks = nbytes = 0
+    for data in messages:
+        view = memoryview(data).cast('B')
+        n = view.nbytes
+        if n > SHORT_MESSAGE:
+            # SHA256Hash records its own blocks and bytes when profiling
+            digests.append(SHA256Hash(view).digest())
+            continue
+        _pad_short(block, view)
+        w[:16] = unpack(block)
+        digests.append(pack(*compress_block(HASH_VALUES, w)))
+        blocks += 1
+        nbytes += n
+    if profiler is not None:
+        profiler.record('hash_many', time.perf_counter() - started, blocks, nbytes)
+    return digests
+
+
+class MidstateCache:
+    """
+    Bounded LRU cache of midstates: SHA256Hash objects that have already compressed a message prefix.  Hashing many
+    messages that share a prefix (a protocol header, a salted namespace...) then only compresses each suffix, and a
+    prefix seen before costs a dictionary lookup and a copy().  The prefixes themselves are the keys, so at most
+    maxsize prefixes are kept.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._midstates = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._midstates)
+
+    def midstate(self, prefix):
+        """Return a new SHA256Hash that has hashed prefix, compressing the prefix only if it is not cached"""
+        prefix = bytes(prefix)
+        with self._lock:
+            hasher = self._midstates.get(prefix)
+            if hasher is not None:
+                self.hits += 1
+                self._midstates.move_to_end(prefix)
+                return hasher.copy()
+            self.misses += 1
+        hasher = SHA256Hash(prefix)
+        with self._lock:
+            self._midstates[prefix] = hasher
+            # evict the least recently used prefixes
+            while len(self._midstates) > self.maxsize:
+                self._midstates.popitem(last=False)
+        return hasher.copy()
+
+    def hash(self, prefix, suffix=b''):
+        """Return a SHA256Hash of prefix + suffix, starting from the midstate of prefix"""
+        hasher = self.midstate(prefix)
+        hasher.update(suffix)
+        return hasher
+
+    def clear(self):
+        with self._lock:
+            self._midstates.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# shared cache used by hash_with_prefix
+MIDSTATE_CACHE = MidstateCache()
+
+
+def hash_with_prefix(prefix, suffix):
+    """Return the SHA256Hash of prefix + suffix, reusing the midstate of prefix from MIDSTATE_CACHE"""
+    return MIDSTATE_CACHE.hash(prefix, suffix)
+
+
+class HashStats:
+    """
+    Counters collected while profiling is enabled: seconds spent and calls made per stage, blocks compressed, bytes
+    hashed, and calls made to each primitive.  Stages are timed exclusively (e.g. parse does not include compression):
+      parse, compression  -- SHA256 (string engine; PreProcessData.pad_data, parse and SHA256.block_decomposition
+                             record pad_data, parse and block_decomposition when called directly)
+      compression         -- SHA256Int
+      update, digest      -- SHA256Hash
+      hash_many           -- the single-block messages of hash_many
+    """
+
+    def __init__(self):
+        self.stage_seconds = collections.defaultdict(float)
+        self.stage_calls = collections.defaultdict(int)
+        self.blocks = 0
+        self.bytes = 0
+        self.primitive_calls = collections.defaultdict(int)
+
+    def report(self):
+        """Readable summary of the counters"""
+        lines = [f"blocks: {self.blocks}, bytes: {self.bytes}"]
+        for stage, seconds in sorted(self.stage_seconds.items(), key=lambda item: -item[1]):
+            lines.append(f"{stage}: {seconds * 1e3:.3f} ms in {self.stage_calls[stage]} calls")
+        for name, calls in sorted(self.primitive_calls.items(), key=lambda item: -item[1]):
+            lines.append(f"{name}: {calls} calls")
+        return '\n'.join(lines)
+
+
+class Profiler:
+    """Collects HashStats and passes every stage measurement to callback(stage, seconds, blocks, nbytes) if given"""
+
+    def __init__(self, callback=None):
+        self.stats = HashStats()
+        self.callback = callback
+
+    def record(self, stage, seconds, blocks=0, nbytes=0):
+        stats = self.stats
+        stats.stage_seconds[stage] += seconds
+        stats.stage_calls[stage] += 1
+        stats.blocks += blocks
+        stats.bytes += nbytes
+        if self.callback is not None:
+            self.callback(stage, seconds, blocks, nbytes)
+
+
+# the active Profiler.  While it is None every stage costs one global lookup and comparison, and the primitives are
+# the plain functions: they are only replaced by counting wrappers while profiling is enabled
+_profiler = None
+PRIMITIVES = ('rotate_right', 'shift_right', 'not_', 'and_', 'xor_', 'binary_add', 'compress', 'compress_buffer')
+SHA256_PRIMITIVES = ('maj', 'ch', 'sigma_0', 'sigma_1', 'epsilon_0', 'epsilon_1')
+_originals = {}
+
+
+def _counting(name, func, counts):
+    def counted(*args):
+        counts[name] += 1
+        return func(*args)
+    return counted
+
+
+def enable_profiling(callback=None):
+    """Start profiling the engines in this module and return the HashStats that collects the counters"""
+    global _profiler
+    disable_profiling()
+    _profiler = Profiler(callback)
+    counts = _profiler.stats.primitive_calls
+    module = globals()
+    for name in PRIMITIVES:
+        _originals[name] = module[name]
+        module[name] = _counting(name, module[name], counts)
+    for name in SHA256_PRIMITIVES:
+        _originals['SHA256.' + name] = SHA256.__dict__[name]
+        setattr(SHA256, name, staticmethod(_counting(name, getattr(SHA256, name), counts)))
+    return _profiler.stats
+
+
+def disable_profiling():
+    """Stop profiling and restore the plain primitives"""
+    global _profiler
+    module = globals()
+    for name, func in _originals.items():
+        if name.startswith('SHA256.'):
+            setattr(SHA256, name[len('SHA256.'):], func)
+        else:
+            module[name] = func
+    _originals.clear()
+    _profiler = None
+
+
+@contextlib.contextmanager
+def profiling(callback=None):
+    """Context manager: profile the engines inside the with block, yielding the HashStats"""
+    stats = enable_profiling(callback)
+    try:
+        yield stats
+    finally:
+        disable_profiling()
+
+
+# files are hashed in 1 MiB windows of a memory map, or read into a reusable 1 MiB buffer when they can't be mapped
+CHUNK_SIZE = 1 << 20
+# hash_stream checkpoints (when asked to) after about this many bytes
+CHECKPOINT_EVERY = 4 << 20
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    """
+    Hash the file at path ('-' for standard input) and return the SHA256Hash.  Regular files are memory-mapped and
+    fed to the hasher as memoryview windows, anything else (pipes, empty files...) is read with readinto into a single
+    reusable buffer, so there are no per-chunk bytes copies and memory stays constant for any file size.
+    """
+    if path == '-':
+        return hash_stream(sys.stdin.buffer, chunk_size)
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # empty files and non-regular files can't be mapped
+            return hash_stream(f, chunk_size)
+        hasher = SHA256Hash()
+        with mapped:
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mapped) as view:
+                for offset in range(0, len(view), chunk_size):
+                    hasher.update(view[offset:offset + chunk_size])
+    return hasher
+
+
+def hash_stream(f, chunk_size=CHUNK_SIZE, hasher=None, checkpoint=None, checkpoint_every=CHECKPOINT_EVERY):
+    """
+    Hash the binary file object f (continuing from hasher if given) by reading into one preallocated buffer, and
+    return the SHA256Hash.  If checkpoint is given it is called with hasher.checkpoint() about every checkpoint_every
+    bytes: to resume after an interruption, restore the last one with SHA256Hash.resume, seek f to its length and
+    pass it as hasher
+    """
+    if hasher is None:
+        hasher = SHA256Hash()
+    buffer = bytearray(chunk_size)
+    unsaved = 0
+    with memoryview(buffer) as view:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+            unsaved += n
+            if checkpoint is not None and unsaved >= checkpoint_every:
+                checkpoint(hasher.checkpoint())
+                unsaved = 0
+    return hasher
+
+
+def escape_name(name):
+    """sha256sum escapes backslashes and newlines in file names, and marks the line with a leading backslash"""
+    if '\\' in name or '\n' in name:
+        return '\\', name.replace('\\', '\\\\').replace('\n', '\\n')
+    return '', name
+
+
+def unescape_name(name):
+    """Undo escape_name for a name read from a checksum line marked with a leading backslash"""
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), name)
+
+
+# <hex digest> <space> <space or * for binary mode> <file name>, with an optional leading backslash for escaped names
+CHECK_LINE = re.compile(r'^(\\?)([0-9a-fA-F]{64}) ([ *])(.*)$')
+
+
+def check(checksum_file, quiet=False, status=False):
+    """
+    Verify the files listed in a sha256sum checksum file ('-' for standard input), printing OK/FAILED for each one
+    in the same format as sha256sum --check.  Returns True if every listed file was read and matched.
+    """
+    def report(message):
+        if not status:
+            print(message)
+
+    failed = unreadable = improper = checked = 0
+    with (sys.stdin if checksum_file == '-' else open(checksum_file, encoding='utf-8', errors='surrogateescape')) as f:
+        for line in f:
+            match = CHECK_LINE.match(line.rstrip('\n'))
+            if not match:
+                improper += 1
+                continue
+            escaped, expected, _, name = match.groups()
+            if escaped:
+                name = unescape_name(name)
+            checked += 1
+            try:
+                digest = hash_file(name).hexdigest()
+            except OSError as error:
+                print(f"sha256: {name}: {error.strerror}", file=sys.stderr)
+                report(f"{name}: FAILED open or read")
+                unreadable += 1
+                continue
+            if digest == expected.lower():
+                if not quiet:
+                    report(f"{name}: OK")
+            else:
+                report(f"{name}: FAILED")
+                failed += 1
+    if not checked:
+        print(f"sha256: {checksum_file}: no properly formatted SHA256 checksum lines found", file=sys.stderr)
+        return False
+    if not status:
+        if improper:
+            print(f"sha256: WARNING: {improper} line{'s are' if improper > 1 else ' is'} improperly formatted",
+                  file=sys.stderr)
+        if unreadable:
+            print(f"sha256: WARNING: {unreadable} listed file{'s' if unreadable > 1 else ''} could not be read",
+                  file=sys.stderr)
+        if failed:
+            print(f"sha256: WARNING: {failed} computed checksum{'s' if failed > 1 else ''} did NOT match",
+                  file=sys.stderr)
+    return not (failed or unreadable)
+
+
+def main(argv=None):
+    """Command line entry point (python -m sha256), with the same output format as sha256sum"""
+    parser = argparse.ArgumentParser(prog='sha256', description='Print or check SHA-256 checksums.  With no FILE, or '
+                                                                'when FILE is -, read standard input.')
+    parser.add_argument('files', nargs='*', default=['-'], metavar='FILE')
+    parser.add_argument('-c', '--check', action='store_true', help='read checksums from the FILEs and check them')
+    parser.add_argument('--quiet', action='store_true', help="don't print OK for each successfully verified file")
+    parser.add_argument('--status', action='store_true', help="don't output anything, status code shows success")
+    args = parser.parse_args(argv)
+    ok = True
+    for name in args.files:
+        try:
+            if args.check:
+                ok = check(name, quiet=args.quiet, status=args.status) and ok
+                continue
+            digest = hash_file(name).hexdigest()
+        except OSError as error:
+            print(f"sha256: {name}: {error.strerror}", file=sys.stderr)
+            ok = False
+            continue
+        escaped, printed_name = escape_name(name)
+        print(f"{escaped}{digest}  {printed_name}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
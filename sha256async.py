@@ -0,0 +1,98 @@
+'''
+asyncio helpers for hashing async byte streams with SHA256Hash, moving large chunks off the event loop.
+
+Pure Python compression takes about 100 microseconds per 64 byte block, so any chunk of OFFLOAD_SIZE bytes or more is
+hashed in an executor (the loop's default thread pool unless another executor is given; a ProcessPoolExecutor also
+works since SHA256Hash objects are small and picklable, and chunks that are not bytes, such as the memoryview slices of
+AsyncHasher.hash_bytes, are copied to bytes to be sent to it).  Smaller chunks are hashed inline.  AsyncHasher also
+bounds the number of hashes in flight at once.
+
+The default thread pool does not stop the event loop from stalling: hashing is pure Python and holds the GIL, so the
+loop only gets to run when the interpreter switches threads (sys.getswitchinterval(), 5 ms by default) and has to
+share the GIL with every hashing thread.  Offloading to threads only limits the longest stalls, to a few switch
+intervals instead of the time to hash a whole payload (python sha256bench.py async: tens of ms rather than seconds
+for 256 KB, with a p50 lateness of about 12 ms).  Pass a ProcessPoolExecutor to keep the loop responsive.
+'''
+
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from sha256 import SHA256Hash
+
+# chunks at least this large are hashed in the executor rather than on the event loop
+OFFLOAD_SIZE = 1024
+READ_SIZE = 1 << 16
+
+
+def _updated(hasher, chunk):
+    """Executor task: update hasher with chunk and return it (a copy comes back from a process pool)"""
+    hasher.update(chunk)
+    return hasher
+
+
+async def update(hasher, chunk, executor=None, offload_size=OFFLOAD_SIZE):
+    """Hash chunk into hasher, in executor if the chunk is large.  Returns the updated hasher"""
+    if len(chunk) < offload_size:
+        hasher.update(chunk)
+        return hasher
+    if isinstance(executor, ProcessPoolExecutor) and not isinstance(chunk, bytes):
+        # memoryviews and other buffers can't be pickled to a worker process
+        chunk = bytes(chunk)
+    return await asyncio.get_running_loop().run_in_executor(executor, _updated, hasher, chunk)
+
+
+async def hash_chunks(chunks, executor=None, offload_size=OFFLOAD_SIZE):
+    """Hash the chunks of an async iterable of bytes-like objects, returning the SHA256Hash"""
+    hasher = SHA256Hash()
+    async for chunk in chunks:
+        hasher = await update(hasher, chunk, executor, offload_size)
+    return hasher
+
+
+async def hash_reader(reader, executor=None, offload_size=OFFLOAD_SIZE, read_size=READ_SIZE):
+    """Hash everything read from an asyncio.StreamReader until EOF, returning the SHA256Hash"""
+    hasher = SHA256Hash()
+    while True:
+        chunk = await reader.read(read_size)
+        if not chunk:
+            return hasher
+        hasher = await update(hasher, chunk, executor, offload_size)
+
+
+class AsyncHasher:
+    """
+    Runs hash_reader/hash_chunks with at most max_concurrent hashes in flight, further calls wait their turn.  With the
+    default executor (threads) the loop still stalls for a few GIL switch intervals at a time while chunks are hashed,
+    give a ProcessPoolExecutor to avoid that
+    """
+
+    def __init__(self, max_concurrent=4, executor=None, offload_size=OFFLOAD_SIZE):
+        self.executor = executor
+        self.offload_size = offload_size
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def hash_reader(self, reader, read_size=READ_SIZE):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await hash_reader(reader, self.executor, self.offload_size, read_size)
+            finally:
+                self.in_flight -= 1
+
+    async def hash_chunks(self, chunks):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await hash_chunks(chunks, self.executor, self.offload_size)
+            finally:
+                self.in_flight -= 1
+
+    async def hash_bytes(self, data):
+        """Hash one bytes-like object, split into chunks so the loop can run between them"""
+        async def chunks():
+            with memoryview(data).cast('B') as view:
+                for offset in range(0, max(len(view), 1), READ_SIZE):
+                    yield view[offset:offset + READ_SIZE]
+        return await self.hash_chunks(chunks())
@@ -0,0 +1,214 @@
+'''
+One entry point for SHA-256 that dispatches to the fastest implementation available:
+
+    reference  SHA256, the readable bit-string engine (only used when forced)
+    int        SHA256Hash, the pure Python int engine
+    unrolled   sha256unrolled, the int engine with generated straight-line compression
+    numpy      sha256batch, numpy lanes for many messages at once
+    hashlib    the C implementation in hashlib, when the deployment allows it (SHA256_NATIVE is not 0)
+
+Every backend is probed when the module is imported: it has to load, then reproduce the known digests in VECTORS,
+before it can be selected.  A backend that fails is kept with the reason in its error attribute.
+
+Calls are routed by their shape and size (see POLICY): many messages at once go to the numpy lanes unless hashlib is
+allowed, everything else to hashlib or the fastest pure Python engine.  The environment variable SHA256_BACKEND forces
+one backend for every call.  usage counts the messages each backend has hashed, and status() (or python
+sha256backend.py) reports what was probed, what is selected, and what served the traffic so far.
+'''
+
+
+import argparse
+import collections
+import hashlib
+import os
+import sys
+import threading
+
+from sha256 import SHA256, SHA256Hash
+
+OVERRIDE_VARIABLE = 'SHA256_BACKEND'
+NATIVE_VARIABLE = 'SHA256_NATIVE'
+
+# NIST FIPS 180-2 example messages (one block, one block, two blocks)
+VECTORS = (
+    (b'', 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'),
+    (b'abc', 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad'),
+    (b'abcdbcdecdefdefgefghfghighijhijkijkljklmklmnlmnomnopnopq',
+     '248d6a61d20638b8e5c026930c3e6039a33ce45964ff2167f6ecedd419db06c1'),
+)
+
+# (minimum number of messages per call, maximum message size or None, backends in order of preference): the first
+# rule matching a call picks its first available backend.  The numpy lanes overtake one message at a time from
+# about 32 messages per call (python sha256bench.py batch), and messages above 1 MB are kept out of them to bound
+# the size of the working arrays.
+BATCH_MIN = 32
+BATCH_MAX_SIZE = 1 << 20
+POLICY = (
+    (BATCH_MIN, BATCH_MAX_SIZE, ('hashlib', 'numpy', 'unrolled', 'int')),
+    (1, None, ('hashlib', 'unrolled', 'int')),
+)
+
+
+def _load_reference():
+    return (lambda data: bytes.fromhex(SHA256(data).hexdigest())), None
+
+
+def _load_int():
+    return (lambda data: SHA256Hash(data).digest()), None
+
+
+def _load_unrolled():
+    import sha256unrolled
+    return (lambda data: bytes.fromhex(sha256unrolled.SHA256Unrolled(data).generate_hash())), None
+
+
+def _load_numpy():
+    import sha256batch
+    return (lambda data: sha256batch.batch_digest([data])[0]), sha256batch.batch_digest
+
+
+def _load_hashlib():
+    if os.environ.get(NATIVE_VARIABLE, '1') == '0':
+        raise RuntimeError(f'disabled by {NATIVE_VARIABLE}=0')
+    return (lambda data: hashlib.sha256(data).digest()), None
+
+
+LOADERS = {
+    'reference': _load_reference,
+    'int': _load_int,
+    'unrolled': _load_unrolled,
+    'numpy': _load_numpy,
+    'hashlib': _load_hashlib,
+}
+
+
+class Backend:
+    """
+    One implementation: digest(data) returns the 32 byte digest of one message, digest_many(messages) the list of
+    digests of several.  available is True once the backend has loaded and passed the self-test, otherwise error says
+    why not
+    """
+
+    def __init__(self, name, load):
+        self.name = name
+        self.available = False
+        self.error = None
+        try:
+            self.digest, digest_many = load()
+            if digest_many is not None:
+                self.digest_many = digest_many
+            self.self_test()
+        except Exception as exc:
+            self.error = f'{type(exc).__name__}: {exc}'
+        else:
+            self.available = True
+
+    def __repr__(self):
+        return f'Backend({self.name!r}, available={self.available})'
+
+    def digest_many(self, messages):
+        return [self.digest(data) for data in messages]
+
+    def self_test(self):
+        """Raise RuntimeError unless the backend reproduces the digests of VECTORS, one at a time and together"""
+        messages = [data for data, _ in VECTORS]
+        expected = [bytes.fromhex(digest) for _, digest in VECTORS]
+        if [self.digest(data) for data in messages] != expected or list(self.digest_many(messages)) != expected:
+            raise RuntimeError('self-test failed')
+
+
+# name -> Backend, the backend forced by SHA256_BACKEND (or None), and the number of messages hashed by each backend
+backends = {}
+override = None
+usage = collections.Counter()
+_lock = threading.Lock()
+
+
+def probe():
+    """
+    Load and self-test every backend and read SHA256_BACKEND, replacing the results of the previous probe (done at
+    import).  Raises ValueError if SHA256_BACKEND names an unknown backend and RuntimeError if it names one that
+    is not available
+    """
+    global backends, override
+    probed = {name: Backend(name, load) for name, load in LOADERS.items()}
+    forced = os.environ.get(OVERRIDE_VARIABLE) or None
+    if forced is not None:
+        if forced not in probed:
+            raise ValueError(f'{OVERRIDE_VARIABLE}={forced}: unknown backend, expected one of {", ".join(probed)}')
+        if not probed[forced].available:
+            raise RuntimeError(f'{OVERRIDE_VARIABLE}={forced}: backend not available ({probed[forced].error})')
+    backends = probed
+    override = forced
+    return backends
+
+
+def select(size, count=1):
+    """Return the Backend that serves a call hashing count messages of at most size bytes"""
+    if override is not None:
+        return backends[override]
+    for min_count, max_size, names in POLICY:
+        if count >= min_count and (max_size is None or size <= max_size):
+            for name in names:
+                if backends[name].available:
+                    return backends[name]
+    raise RuntimeError('no SHA-256 backend available')
+
+
+def _record(backend, count):
+    with _lock:
+        usage[backend.name] += count
+
+
+def digest(data):
+    """Return the 32 byte SHA-256 digest of the bytes-like data"""
+    if isinstance(data, str):
+        raise TypeError('Strings must be encoded before hashing')
+    backend = select(memoryview(data).nbytes)
+    _record(backend, 1)
+    return backend.digest(data)
+
+
+def hexdigest(data):
+    """Return the SHA-256 digest of data as a string of 64 hex digits"""
+    return digest(data).hex()
+
+
+def digest_many(messages):
+    """Return the list of digests of messages (bytes-like), in order"""
+    messages = list(messages)
+    if any(isinstance(data, str) for data in messages):
+        raise TypeError('Strings must be encoded before hashing')
+    if not messages:
+        return []
+    backend = select(max(memoryview(data).nbytes for data in messages), len(messages))
+    _record(backend, len(messages))
+    return list(backend.digest_many(messages))
+
+
+def status():
+    """Return a dictionary describing every backend: whether it is available (or why not), whether it is the one
+    forced by SHA256_BACKEND, and how many messages it has hashed"""
+    with _lock:
+        counts = dict(usage)
+    return {name: {'available': backend.available, 'error': backend.error, 'forced': name == override,
+                   'messages': counts.get(name, 0)}
+            for name, backend in backends.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sha256backend', description='Show the SHA-256 backends and their selection')
+    parser.parse_args(argv)
+    for name, info in status().items():
+        state = 'available' if info['available'] else f"unavailable ({info['error']})"
+        print(f"{name}: {state}{', forced by ' + OVERRIDE_VARIABLE if info['forced'] else ''}")
+    print(f'one message: {select(0).name}')
+    print(f'{BATCH_MIN} messages: {select(0, BATCH_MIN).name}')
+    return 0
+
+
+probe()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
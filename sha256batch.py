@@ -0,0 +1,99 @@
+'''
+Batch SHA-256 engine: hashes many messages at once by running the message schedule and the 64 compression rounds as
+vectorized numpy uint32 operations, one lane per message (the same layout SIMD implementations use).
+
+Messages are grouped by their number of padded blocks, so every lane in a group compresses the same number of blocks
+and no work is masked out.  Digests are identical to the scalar engines in sha256.py.
+
+Requires numpy.
+'''
+
+
+import numpy as np
+
+from sha256 import HASH_VALUES, ROUND_CONSTANTS, PreProcessData, padding
+
+# messages per group are processed in slices of at most this many lanes, to bound the size of the working arrays
+MAX_LANES = 1 << 16
+
+K = np.array(ROUND_CONSTANTS, dtype=np.uint32)
+H0 = np.array(HASH_VALUES, dtype=np.uint32)
+
+
+def rotate_right(x, shift):
+    """Rotate every 32-bit lane of x right by shift (uint32 arithmetic drops the bits shifted past bit 31)"""
+    return (x >> np.uint32(shift)) | (x << np.uint32(32 - shift))
+
+
+def compress_lanes(state, words):
+    """
+    Vectorized version of sha256.compress.  state is an (8, lanes) uint32 array of hash values and words an
+    (16, lanes) uint32 array holding one message block per lane.  Returns the updated (8, lanes) hash values.
+    uint32 additions wrap modulo 2^32, so no masking is needed.
+    """
+    w = np.empty((64, words.shape[1]), dtype=np.uint32)
+    w[:16] = words
+    # extend the 16 words into the 64 word message schedule, for all lanes at once
+    for i in range(16, 64):
+        x = w[i - 15]
+        y = w[i - 2]
+        s0 = rotate_right(x, 7) ^ rotate_right(x, 18) ^ (x >> np.uint32(3))
+        s1 = rotate_right(y, 17) ^ rotate_right(y, 19) ^ (y >> np.uint32(10))
+        w[i] = w[i - 16] + s0 + w[i - 7] + s1
+    a, b, c, d, e, f, g, h = state
+    # compression loop mutate the values of a...h
+    for j in range(64):
+        s1 = rotate_right(e, 6) ^ rotate_right(e, 11) ^ rotate_right(e, 25)
+        ch = g ^ (e & (f ^ g))
+        temp1 = h + s1 + ch + K[j] + w[j]
+        s0 = rotate_right(a, 2) ^ rotate_right(a, 13) ^ rotate_right(a, 22)
+        maj = (a & b) | (c & (a | b))
+        temp2 = s0 + maj
+        h = g
+        g = f
+        f = e
+        e = d + temp1
+        d = c
+        c = b
+        b = a
+        a = temp1 + temp2
+    return state + np.stack((a, b, c, d, e, f, g, h))
+
+
+def _hash_group(padded_messages, block_count):
+    """Hash messages that all pad to block_count blocks, returning an (8, lanes) array of final hash values"""
+    # read the padded messages as big-endian words: one row of block_count * 16 words per lane
+    words = np.frombuffer(b''.join(padded_messages), dtype='>u4').astype(np.uint32)
+    words = words.reshape(len(padded_messages), block_count, 16)
+    state = np.repeat(H0[:, None], len(padded_messages), axis=1)
+    for i in range(block_count):
+        # transpose so that word j of every lane is one contiguous row
+        state = compress_lanes(state, np.ascontiguousarray(words[:, i, :].T))
+    return state
+
+
+def batch_digest(messages, max_lanes=MAX_LANES):
+    """
+    Return the list of 32 byte digests of messages (strings are hashed as UTF-8, anything else must be bytes-like),
+    in the same order as messages.
+    """
+    groups = {}
+    for index, message in enumerate(messages):
+        message = PreProcessData(message).message
+        padded = bytes(message) + padding(len(message))
+        groups.setdefault(len(padded) // PreProcessData.BLOCK_SIZE, []).append((index, padded))
+    digests = [None] * sum(len(group) for group in groups.values())
+    for block_count, group in groups.items():
+        for start in range(0, len(group), max_lanes):
+            lanes = group[start:start + max_lanes]
+            state = _hash_group([padded for _, padded in lanes], block_count)
+            # one row of 8 big-endian words per lane is the digest of that lane
+            output = state.T.astype('>u4').tobytes()
+            for lane, (index, _) in enumerate(lanes):
+                digests[index] = output[lane * 32:lane * 32 + 32]
+    return digests
+
+
+def batch_hexdigest(messages, max_lanes=MAX_LANES):
+    """Return the list of hex digests of messages, in the same order as messages"""
+    return [digest.hex() for digest in batch_digest(messages, max_lanes)]
@@ -0,0 +1,700 @@
+'''
+Benchmarks for SHA256.py
+
+Throughput (the default): ns/hash and MB/s of every engine for message sizes from 0 B to 1 GB, against hashlib
+SHA-256 and SHA-512.  Each measurement is warmed up first, then the best of several timed repeats is kept.  Sizes an
+engine can't hash within the time budget (the string reference engine manages about 5 KB/s) are skipped.  Results
+can be saved as a JSON baseline, and compared against one: the run fails (exit status 1) when any engine is slower
+than its baseline by more than the threshold.
+Startup: import time of the sha256 module and the cost of constructing SHA256 / PreProcessData objects, compared with
+deriving the hash values and round constants on every construction (trial division primes and float roots) as the
+module used to.
+Int engine: time per hash of a 20 character key with the SHA256 class and SHA256Int, and the speedup of the integer
+compression over the string one.
+Batch: hashes per second of 20 character keys through SHA256Int one at a time and through the numpy batch engine.
+Short: calls per second on 20 character keys (one block) of the SHA256 class, SHA256Int, SHA256Hash, hash_block and
+hash_many.
+PBKDF2: iterations per second of sha256hmac.pbkdf2_hmac and hashlib.pbkdf2_hmac.
+Nonce search: double SHA-256 hashes per second of sha256pow.search for 1 up to the number of CPUs workers.
+Async: lateness of a 1 ms ticker coroutine (p50/p99/max) while hashing on the event loop, inline and with
+sha256async in the default thread pool and in a process pool.
+Profiling: time per hash of the string and int engines with profiling disabled and enabled, and of the bare compress
+loop the int engine wraps (the cost of the disabled hooks).
+Unrolled: code generation + compile time and cached load time of sha256unrolled, and time per block of the string,
+loop and unrolled compression functions.
+Family: MB/s of every sha256family variant on a 64 KB message, next to hashlib's.
+Monte Carlo: hashes/s of every engine (but the string and numpy ones) on the first checkpoint of the CAVP Monte Carlo
+test (1000 chained hashes of 96 bytes); python sha256cavp.py --monte-only runs all 100,000.
+Dedup: MB/s of sha256dedup chunking and of storing a 4 MB file into an empty chunk store, then MB/s and dedup ratio
+(bytes stored / bytes written) of storing edited versions of it (insertions, deletions and overwrites).
+Checkpoint: size and cost of SHA256Hash.checkpoint() and resume(), and the slowdown of checkpointing every 4 MB for
+SHA256Hash and (for scale) hashlib.
+Shared memory: MB/s of hashing 8 buffers of 256 KB with sha256shm.SharedMemoryPool and with a ProcessPoolExecutor
+that pickles the buffers, for 1 up to the number of CPUs workers.
+Merkle: seconds to build the sha256merkle index of a sparse 1 GB file, to update it after a 4 KB change given as a
+change list, and to update it after a 4 KB change found by comparing CRC-32s.
+Tree hash: MB/s of sha256treehash.tree_hash_file on a temporary file, for 1 up to the number of CPUs worker processes.
+
+Run with: python sha256bench.py [throughput] [--sizes 0 64 1K 1M] [--engines SHA256Int hashlib.sha256]
+                                [--save BASELINE.json] [--compare BASELINE.json] [--threshold 0.1]
+          python sha256bench.py startup|int|batch|short|pbkdf2|nonce|async|profiling|unrolled|family|montecarlo|dedup|checkpoint|shm|merkle|tree|all
+'''
+
+
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from string import ascii_uppercase, digits, ascii_lowercase
+
+from sha256 import *
+
+
+def legacy_hash_values():
+    """Hash values derived the way PreProcessData.hash_values used to on every call: trial division primes, float
+    square roots, formatted as hex and binary strings"""
+    floor = [math.floor(math.modf(math.sqrt(n))[0] * 16 ** 8) for n in get_primes(8)]
+    return [('0x' + (hex(x)[2:].zfill(8)), format(x, "b").zfill(32)) for x in floor]
+
+
+def legacy_round_constants():
+    """Round constants derived the way PreProcessData.round_constants used to on every call"""
+    floor = [math.floor(math.modf(n ** (1. / 3.))[0] * 16 ** 8) for n in get_primes(64)]
+    return [('0x' + (hex(x)[2:].zfill(8)), format(x, "b").zfill(32)) for x in floor]
+
+
+def best_time(func, number, repeat=5):
+    """Best time per call of func in seconds over repeat runs of number calls"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def benchmark_import(runs=10):
+    """Best wall time in seconds of a fresh interpreter importing sha256, less the time of a bare interpreter"""
+    def run(code):
+        return min(timeit.repeat(lambda: subprocess.run([sys.executable, '-c', code], check=True),
+                                 number=1, repeat=runs))
+    return run('import sha256') - run('pass')
+
+
+def benchmark_startup(number=1000):
+    """Per-object construction cost with the cached tables, and with the tables derived on each construction"""
+    results = {
+        'PreProcessData("hello world")': best_time(lambda: PreProcessData("hello world"), number),
+        'SHA256("hello world")': best_time(lambda: SHA256("hello world"), number),
+        'SHA256Int("hello world")': best_time(lambda: SHA256Int("hello world"), number),
+        'SHA256Hash()': best_time(lambda: SHA256Hash(), number),
+        'SHA256("hello world") with legacy tables':
+            best_time(lambda: (PreProcessData("hello world"), legacy_hash_values(), legacy_round_constants()),
+                      number // 10),
+    }
+    return results
+
+
+def benchmark_int_engine(length=20, number=20, repeat=5):
+    """
+    Seconds per generate_hash of a random key of length characters with the string and the integer engine.  The two
+    engines are timed alternately in each of repeat rounds and the best round is kept, so that a load change on the
+    machine affects both
+    """
+    key = ''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in range(length))
+    engines = {'SHA256': (lambda: _string_engine(key), number),
+               'SHA256Int': (lambda: SHA256Int(key).generate_hash(), number * 50)}
+    results = dict.fromkeys(engines, float('inf'))
+    for _ in range(repeat):
+        for name, (func, calls) in engines.items():
+            results[name] = min(results[name], best_time(func, calls, 1))
+    return results
+
+
+def benchmark_batch(count=20000, length=20):
+    """Seconds per hash of count random keys of length characters, for the scalar and the batch engine"""
+    keys = [''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in range(length))
+            for _ in range(count)]
+    results = {'SHA256Int': best_time(lambda: [SHA256Int(key).generate_hash() for key in keys[:count // 10]],
+                                      1, 3) / (count // 10)}
+    try:
+        import sha256batch
+    except ImportError:
+        return results
+    results['sha256batch'] = best_time(lambda: sha256batch.batch_hexdigest(keys), 1, 3) / count
+    return results
+
+
+def benchmark_short(count=2000, length=20):
+    """Messages per second of hashing count random keys of length characters with each one-message API, and with
+    hash_many (the string SHA256 class on a tenth of the keys)"""
+    keys = [''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in range(length)).encode()
+            for _ in range(count)]
+    few = keys[:count // 10]
+    return {
+        'SHA256': len(few) / best_time(lambda: [_string_engine(key) for key in few], 1, 3),
+        'SHA256Int': count / best_time(lambda: [SHA256Int(key).generate_hash() for key in keys], 1, 3),
+        'SHA256Hash': count / best_time(lambda: [SHA256Hash(key).digest() for key in keys], 1, 3),
+        'hash_block': count / best_time(lambda: [hash_block(key) for key in keys], 1, 3),
+        'hash_many': count / best_time(lambda: hash_many(keys), 1, 3),
+    }
+
+
+def benchmark_pbkdf2(iterations=2000):
+    """PBKDF2-HMAC-SHA256 iterations per second for sha256hmac and hashlib"""
+    import sha256hmac
+    return {
+        'sha256hmac.pbkdf2_hmac': iterations / best_time(lambda: sha256hmac.pbkdf2_hmac(b'password', b'salt',
+                                                                                         iterations), 1, 3),
+        'hashlib.pbkdf2_hmac': iterations * 100 / best_time(lambda: hashlib.pbkdf2_hmac('sha256', b'password', b'salt',
+                                                                                         iterations * 100), 1, 3),
+    }
+
+
+def benchmark_nonce_search(nonces=20000, workers=None):
+    """Hashes per second of an exhaustive search (target 0, so no early exit) over nonces nonces per worker count"""
+    import sha256pow
+    header = os.urandom(sha256pow.HEADER_SIZE)
+    return {count: sha256pow.search(header, 0, end=nonces, workers=count, chunk_size=2048).hashes_per_second
+            for count in workers or range(1, (os.cpu_count() or 1) + 1)}
+
+
+def benchmark_async(size=256 << 10, hashes=4):
+    """
+    Ticker lateness in ms (p50, p99, max) while hashes payloads of size bytes are hashed by calling SHA256Hash inline in
+    a coroutine, and through sha256async.AsyncHasher with its default thread pool and with a process pool
+    """
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+    import sha256async
+    payload = os.urandom(size)
+
+    async def inline():
+        return SHA256Hash(payload)
+
+    async def run(hash_coroutine):
+        lateness = []
+        done = False
+
+        async def ticker():
+            loop = asyncio.get_running_loop()
+            while not done:
+                start = loop.time()
+                await asyncio.sleep(0.001)
+                lateness.append(loop.time() - start - 0.001)
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0.01)
+        await asyncio.gather(*(hash_coroutine() for _ in range(hashes)))
+        done = True
+        await task
+        lateness.sort()
+        return tuple(lateness[int(p * (len(lateness) - 1))] * 1e3 for p in (0.5, 0.99, 1.0))
+
+    async def offloaded(executor=None):
+        hasher = sha256async.AsyncHasher(max_concurrent=2, executor=executor)
+        return await run(lambda: hasher.hash_bytes(payload))
+    results = {'inline': asyncio.run(run(inline)), 'sha256async threads': asyncio.run(offloaded())}
+    with ProcessPoolExecutor(2) as executor:
+        # start the workers first, so their start-up is not counted as lateness
+        list(executor.map(abs, range(2)))
+        results['sha256async processes'] = asyncio.run(offloaded(executor))
+    return results
+
+
+def benchmark_profiling(size=1 << 10):
+    """Seconds per hash of size bytes with profiling disabled and enabled, and of the uninstrumented compress loop"""
+    data = message(size)
+    short = message(20)
+
+    def bare():
+        h = HASH_VALUES
+        for block in PreProcessData(data).message_blocks():
+            h = compress(h, block)
+        return h
+    results = {
+        f'compress loop {format_size(size)}': measure(bare),
+        f'SHA256Int {format_size(size)} disabled': measure(lambda: SHA256Int(data).generate_hash()),
+        'SHA256 20 disabled': measure(lambda: _string_engine(short)),
+    }
+    with profiling():
+        results[f'SHA256Int {format_size(size)} enabled'] = measure(lambda: SHA256Int(data).generate_hash())
+        results['SHA256 20 enabled'] = measure(lambda: _string_engine(short))
+    return results
+
+
+def benchmark_unrolled():
+    """Seconds to generate and compile the unrolled function and to load it from the disk cache, and seconds per block
+    of the string (generate_hash of a one block message), loop and unrolled compression"""
+    import sha256unrolled
+    words = list(range(16))
+    with tempfile.TemporaryDirectory() as directory:
+        sha256unrolled.build(cache_dir=directory)
+        cached = measure(lambda: sha256unrolled.build(cache_dir=directory))
+    return {
+        'generate + compile': measure(lambda: sha256unrolled.build(cache_dir=None)),
+        'load from disk cache': cached,
+        'string compression (1 block)': measure(lambda: _string_engine(b'')),
+        'loop compress': measure(lambda: compress(HASH_VALUES, words)),
+        'unrolled compress': measure(lambda: sha256unrolled.compress(HASH_VALUES, words)),
+    }
+
+
+def benchmark_family(size=64 << 10):
+    """MB/s of each SHA-2 variant of sha256family and of hashlib on a size byte message"""
+    import sha256family
+    data = message(size)
+    results = {}
+    for name in sha256family.VARIANTS:
+        results[name] = (size / measure(lambda: sha256family.new(name, data).digest(), repeat=3) / 1e6,
+                         size / measure(lambda: hashlib.new(name, data).digest()) / 1e6)
+    return results
+
+
+def benchmark_monte_carlo(engines=None, checkpoints=1):
+    """Hashes per second of each engine over the first checkpoints checkpoints of the CAVP Monte Carlo test"""
+    import sha256cavp
+    path = os.path.join(sha256cavp.VECTOR_DIR, sha256cavp.MONTE_FILE)
+    engines = engines or [name for name in sha256cavp.available_engines() if name not in ('SHA256', 'sha256batch')]
+    results = {}
+    for engine in engines:
+        result = sha256cavp.check_monte(engine, path, checkpoints)
+        if not result.ok:
+            raise AssertionError(result.line())
+        results[engine] = result.hashes / result.seconds
+    return results
+
+
+def edit(data, rng, edits=8, size=100):
+    """Return data with edits random insertions, deletions and overwrites of up to size bytes"""
+    for _ in range(edits):
+        offset = rng.randrange(len(data))
+        length = rng.randrange(1, size)
+        kind = rng.choice(('insert', 'delete', 'overwrite'))
+        if kind == 'insert':
+            data = data[:offset] + rng.randbytes(length) + data[offset:]
+        elif kind == 'delete':
+            data = data[:offset] + data[offset + length:]
+        else:
+            data = data[:offset] + rng.randbytes(length) + data[offset + length:]
+    return data
+
+
+def benchmark_dedup(size=4 << 20, versions=3):
+    """MB/s of chunking, of storing a size byte file, and (MB/s, dedup ratio) of storing versions edited versions"""
+    import sha256dedup
+    rng = random.Random(0)
+    data = rng.randbytes(size)
+    results = {'chunking': size / best_time(lambda: sha256dedup.chunk_bytes(data), 1, 3) / 1e6}
+    with tempfile.TemporaryDirectory() as directory:
+        store = sha256dedup.ChunkStore(directory)
+        start = time.perf_counter()
+        store.store(io.BytesIO(data))
+        results['first store'] = size / (time.perf_counter() - start) / 1e6
+        for version in range(1, versions + 1):
+            data = edit(data, rng)
+            store.stats = sha256dedup.StoreStats()
+            start = time.perf_counter()
+            store.store(io.BytesIO(data))
+            results[f'edited version {version}'] = (len(data) / (time.perf_counter() - start) / 1e6,
+                                                    store.stats.dedup_ratio)
+    return results
+
+
+def benchmark_checkpoint(interval=CHECKPOINT_EVERY):
+    """Checkpoint size in bytes, seconds per checkpoint() and resume(), and the fraction of time checkpointing every
+    interval bytes adds to hashing with SHA256Hash and with hashlib"""
+    hasher = SHA256Hash(bytes(100))
+    checkpoint = hasher.checkpoint()
+    save = measure(hasher.checkpoint)
+    restore = measure(lambda: SHA256Hash.resume(checkpoint))
+    data = message(64 << 10)
+    python_seconds = measure(lambda: SHA256Hash(data), repeat=3) * interval / len(data)
+    native_seconds = measure(lambda: hashlib.sha256(data)) * interval / len(data)
+    return {'size': len(checkpoint), 'checkpoint': save, 'resume': restore,
+            'overhead SHA256Hash': save / python_seconds, 'overhead hashlib': save / native_seconds}
+
+
+def _pickled_digest(data):
+    return SHA256Hash(data).digest()
+
+
+def benchmark_shared_memory(count=8, size=256 << 10, workers=None):
+    """MB/s of hashing count buffers of size bytes through shared memory and by pickling them, for each worker count
+    (default: 1 up to the number of CPUs)"""
+    import sha256shm
+    from concurrent.futures import ProcessPoolExecutor
+    buffers = [message(size) for _ in range(count)]
+    results = {}
+    for workers_count in workers or range(1, (os.cpu_count() or 1) + 1):
+        with sha256shm.SharedMemoryPool(workers_count) as pool:
+            pool.hash_buffers(buffers[:1])
+            shared = best_time(lambda: pool.hash_buffers(buffers), 1, 2)
+        with ProcessPoolExecutor(workers_count) as executor:
+            list(executor.map(_pickled_digest, buffers[:1]))
+            pickled = best_time(lambda: list(executor.map(_pickled_digest, buffers)), 1, 2)
+        results[workers_count] = (count * size / shared / 1e6, count * size / pickled / 1e6)
+    return results
+
+
+def benchmark_merkle(size=1 << 30, change=4096):
+    """Seconds to build the Merkle index of a sparse size byte file and to update it after a change byte write, with a
+    change list and with a CRC-32 scan"""
+    import sha256merkle
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'image')
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        start = time.perf_counter()
+        with sha256merkle.MerkleIndex(path) as index:
+            results['build'] = time.perf_counter() - start
+            offset = size // 2
+            with open(path, 'r+b') as f:
+                f.seek(offset)
+                f.write(os.urandom(change))
+            start = time.perf_counter()
+            index.update([(offset, change)])
+            results['update (change list)'] = time.perf_counter() - start
+            with open(path, 'r+b') as f:
+                f.seek(offset // 2)
+                f.write(os.urandom(change))
+            start = time.perf_counter()
+            index.update()
+            results['update (CRC-32 scan)'] = time.perf_counter() - start
+    return results
+
+
+def benchmark_tree_hash(size=4 << 20, leaf_size=256 << 10, workers=None):
+    """MB/s of the tree hash of a size byte file for each worker count (default: 1 up to the number of CPUs)"""
+    import sha256treehash
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'data')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        for count in workers or range(1, (os.cpu_count() or 1) + 1):
+            seconds = best_time(lambda: sha256treehash.tree_hash_file(path, leaf_size, workers=count), 1, 2)
+            results[count] = size / seconds / 1e6
+    return results
+
+
+# throughput benchmark: message sizes, seconds an engine may spend on one size, minimum seconds per timed repeat,
+# timed repeats per measurement, and allowed slowdown against a baseline
+SIZES = [0, 64, 1 << 10, 64 << 10, 1 << 20, 16 << 20, 1 << 30]
+BUDGET = 10.0
+MIN_TIME = 0.2
+REPEAT = 5
+THRESHOLD = 0.1
+# messages per call for the batch engine
+BATCH = 256
+
+
+def _string_engine(data):
+    return SHA256(data).hexdigest()
+
+
+def _unrolled_engine(data):
+    import sha256unrolled
+    return sha256unrolled.SHA256Unrolled(data).generate_hash()
+
+
+def _sha512_256_engine(data):
+    import sha256family
+    return sha256family.sha512_256(data).digest()
+
+
+def _batch_engine(data):
+    import sha256batch
+    return sha256batch.batch_digest([data] * BATCH)
+
+
+# name -> (function hashing one message, messages hashed per call)
+ENGINES = {
+    'SHA256': (_string_engine, 1),
+    'SHA256Int': (lambda data: SHA256Int(data).generate_hash(), 1),
+    'SHA256Hash': (lambda data: SHA256Hash(data).digest(), 1),
+    'SHA256Unrolled': (_unrolled_engine, 1),
+    'sha256family.sha512_256': (_sha512_256_engine, 1),
+    'sha256batch': (_batch_engine, BATCH),
+    'hashlib.sha256': (lambda data: hashlib.sha256(data).digest(), 1),
+    'hashlib.sha512': (lambda data: hashlib.sha512(data).digest(), 1),
+}
+
+
+def message(size):
+    """A message of size bytes: 1 MB of random data repeated, the contents don't change the cost of hashing"""
+    block = os.urandom(min(size, 1 << 20))
+    return block * (size // max(len(block), 1)) + block[:size % max(len(block), 1)]
+
+
+def measure(func, min_time=MIN_TIME, repeat=REPEAT):
+    """
+    Seconds per call of func: one warm-up call (then more until min_time has passed, for fast functions), then the
+    best of repeat timed runs of enough calls to take at least min_time each
+    """
+    start = time.perf_counter()
+    func()
+    first = time.perf_counter() - start
+    while time.perf_counter() - start < min_time:
+        func()
+    number = max(1, int(min_time / max(first, 1e-9)))
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def available_engines():
+    """Engine names whose dependencies can be imported here"""
+    names = list(ENGINES)
+    try:
+        import sha256batch
+    except ImportError:
+        names.remove('sha256batch')
+    return names
+
+
+def benchmark_throughput(engines=None, sizes=SIZES, budget=BUDGET, min_time=MIN_TIME, repeat=REPEAT, progress=None):
+    """
+    Return {engine: {size: {'ns_per_hash': ..., 'mb_per_s': ...}}} for each engine and message size.  Sizes are run
+    smallest first, and a size is skipped once the previous result predicts it would take longer than budget
+    seconds.  progress(engine, size, result) is called after each measurement (result is None when skipped).
+    """
+    engines = [name for name in engines or ENGINES if name in available_engines()]
+    results = {}
+    for name in engines:
+        func, per_call = ENGINES[name]
+        results[name] = {}
+        seconds_per_byte = 0.0
+        for size in sorted(sizes):
+            # warm-up, autorange and repeats take about (repeat + 2) calls for slow engines
+            if seconds_per_byte * max(size, 64) * per_call * (repeat + 2) > budget:
+                if progress:
+                    progress(name, size, None)
+                continue
+            data = message(size)
+            seconds = measure(lambda: func(data), min_time, repeat) / per_call
+            seconds_per_byte = seconds / max(size, 64)
+            result = {'ns_per_hash': seconds * 1e9, 'mb_per_s': size / seconds / 1e6}
+            results[name][size] = result
+            if progress:
+                progress(name, size, result)
+    return results
+
+
+def print_result(engine, size, result):
+    if result is None:
+        print(f"{engine:>16} {format_size(size):>6}: skipped (over the time budget)")
+    else:
+        print(f"{engine:>16} {format_size(size):>6}: {result['ns_per_hash']:14.0f} ns/hash "
+              f"{result['mb_per_s']:10.3f} MB/s")
+
+
+def save_baseline(path, results):
+    """Write throughput results to a JSON baseline file, with the interpreter and machine they were measured on"""
+    baseline = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': {engine: {str(size): result for size, result in sizes.items()} for engine, sizes in results.items()},
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def compare_results(results, baseline, threshold=THRESHOLD):
+    """
+    Compare throughput results with a loaded JSON baseline and return a list of (engine, size, slowdown) for every
+    engine and size measured in both that takes more than (1 + threshold) times its baseline time per hash
+    """
+    regressions = []
+    for engine, sizes in results.items():
+        for size, result in sizes.items():
+            reference = baseline['results'].get(engine, {}).get(str(size))
+            if reference is None:
+                continue
+            slowdown = result['ns_per_hash'] / reference['ns_per_hash'] - 1
+            if slowdown > threshold:
+                regressions.append((engine, size, slowdown))
+    return regressions
+
+
+def report_startup():
+    print("Startup benchmark")
+    print(f"import sha256: {benchmark_import() * 1e3:.2f} ms")
+    for name, seconds in benchmark_startup().items():
+        print(f"{name}: {seconds * 1e6:.2f} us")
+
+
+def report_int_engine():
+    print("Int engine benchmark (20 character key)")
+    results = benchmark_int_engine()
+    for name, seconds in results.items():
+        print(f"{name}: {seconds * 1e6:.1f} us/hash")
+    print(f"speedup: {results['SHA256'] / results['SHA256Int']:.0f}x")
+
+
+def report_batch():
+    print("Batch benchmark (20 character keys)")
+    for name, seconds in benchmark_batch().items():
+        print(f"{name}: {1 / seconds:.0f} hashes/s")
+
+
+def report_short():
+    print("Short message benchmark (20 character keys)")
+    for name, rate in benchmark_short().items():
+        print(f"{name}: {rate:.0f} calls/s")
+
+
+def report_pbkdf2():
+    print("PBKDF2-HMAC-SHA256 benchmark")
+    for name, rate in benchmark_pbkdf2().items():
+        print(f"{name}: {rate:.0f} iterations/s")
+
+
+def report_nonce_search():
+    print("Nonce search benchmark")
+    for count, rate in benchmark_nonce_search().items():
+        print(f"{count} worker{'s' if count > 1 else ''}: {rate:.0f} hashes/s")
+
+
+def report_async():
+    print("Async ticker lateness (4 x 256 KB hashes)")
+    for name, (p50, p99, worst) in benchmark_async().items():
+        print(f"{name}: p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {worst:.2f} ms")
+
+
+def report_profiling():
+    print("Profiling overhead")
+    for name, seconds in benchmark_profiling().items():
+        print(f"{name}: {seconds * 1e6:.1f} us")
+
+
+def report_unrolled():
+    print("Unrolled compression benchmark")
+    for name, seconds in benchmark_unrolled().items():
+        print(f"{name}: {seconds * 1e6:.1f} us")
+
+
+def report_family():
+    print("SHA-2 family benchmark (64 KB message)")
+    for name, (throughput, native) in benchmark_family().items():
+        print(f"{name}: {throughput:.2f} MB/s (hashlib {native:.0f} MB/s)")
+
+
+def report_monte_carlo():
+    print("CAVP Monte Carlo benchmark (1000 chained hashes)")
+    for engine, rate in benchmark_monte_carlo().items():
+        print(f"{engine}: {rate:.0f} hashes/s")
+
+
+def report_dedup():
+    print("Dedup benchmark (4 MB file, 8 edits per version)")
+    for name, result in benchmark_dedup().items():
+        if isinstance(result, tuple):
+            print(f"{name}: {result[0]:.2f} MB/s, dedup ratio {result[1]:.1f}")
+        else:
+            print(f"{name}: {result:.2f} MB/s")
+
+
+def report_checkpoint():
+    results = benchmark_checkpoint()
+    print("Checkpoint benchmark (every 4 MB)")
+    print(f"size: {results['size']} bytes")
+    print(f"checkpoint: {results['checkpoint'] * 1e6:.2f} us, resume: {results['resume'] * 1e6:.2f} us")
+    for name in ('SHA256Hash', 'hashlib'):
+        print(f"overhead {name}: {results['overhead ' + name] * 100:.5f}%")
+
+
+def report_shared_memory():
+    print("Shared memory pool benchmark (8 x 256 KB buffers)")
+    for count, (shared, pickled) in benchmark_shared_memory().items():
+        print(f"{count} worker{'s' if count > 1 else ''}: {shared:.2f} MB/s shared memory, {pickled:.2f} MB/s pickled")
+
+
+def report_merkle():
+    print("Merkle index benchmark (sparse 1 GB file, 4 KB change)")
+    for name, seconds in benchmark_merkle().items():
+        print(f"{name}: {seconds * 1e3:.1f} ms")
+
+
+def report_tree_hash():
+    print("Tree hash benchmark (4 MB file, 256 KB leaves)")
+    for count, throughput in benchmark_tree_hash().items():
+        print(f"{count} worker{'s' if count > 1 else ''}: {throughput:.2f} MB/s")
+
+
+REPORTS = {
+    'startup': report_startup,
+    'int': report_int_engine,
+    'batch': report_batch,
+    'short': report_short,
+    'pbkdf2': report_pbkdf2,
+    'nonce': report_nonce_search,
+    'async': report_async,
+    'profiling': report_profiling,
+    'unrolled': report_unrolled,
+    'family': report_family,
+    'montecarlo': report_monte_carlo,
+    'dedup': report_dedup,
+    'checkpoint': report_checkpoint,
+    'shm': report_shared_memory,
+    'merkle': report_merkle,
+    'tree': report_tree_hash,
+}
+
+
+def parse_size(text):
+    """Parse a message size such as 64, 1K, 16M or 1G (powers of 1024)"""
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    if text[-1:].upper() in units:
+        return int(text[:-1]) * units[text[-1:].upper()]
+    return int(text)
+
+
+def format_size(size):
+    for unit, scale in (('G', 1 << 30), ('M', 1 << 20), ('K', 1 << 10)):
+        if size >= scale and size % scale == 0:
+            return f"{size // scale}{unit}"
+    return str(size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sha256bench', description='SHA-256 benchmarks')
+    parser.add_argument('benchmark', nargs='?', default='throughput', choices=['throughput', 'all'] + list(REPORTS))
+    parser.add_argument('--sizes', nargs='+', type=parse_size, default=SIZES, metavar='SIZE',
+                        help='message sizes for the throughput benchmark, e.g. 0 64 1K 1M 1G')
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES), metavar='ENGINE',
+                        help=f'engines for the throughput benchmark: {", ".join(ENGINES)}')
+    parser.add_argument('--budget', type=float, default=BUDGET,
+                        help='skip sizes estimated to take longer than this many seconds for an engine')
+    parser.add_argument('--save', metavar='FILE', help='save the throughput results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare the throughput results with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='allowed slowdown against the baseline before failing (default: 0.1 = 10%%)')
+    args = parser.parse_args(argv)
+    if args.benchmark != 'throughput':
+        for name, report in REPORTS.items():
+            if args.benchmark in (name, 'all'):
+                report()
+        if args.benchmark != 'all':
+            return 0
+    print("Throughput benchmark")
+    results = benchmark_throughput(args.engines, args.sizes, args.budget, progress=print_result)
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for engine, size, slowdown in regressions:
+            print(f"REGRESSION {engine} {format_size(size)}: {slowdown:.1%} slower than baseline")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+'''
+Conformance harness in the format of the NIST CAVP byte-oriented SHA test vectors (SHAVS): the ShortMsg and LongMsg
+files (one message and its digest per record) and the Monte Carlo test (100 checkpoints of 1000 chained hashes each,
+100,000 hashes of 96 byte messages), run against every engine, reporting pass/fail and elapsed time.
+
+The vector files in cavp/ (SHA256ShortMsg.rsp, SHA256LongMsg.rsp, SHA256Monte.rsp) are the byte-oriented SHA-256
+files published by NIST with the SHA Validation System (CAVS 11.0/11.1), vendored unchanged, so the engines are checked
+against digests computed independently of hashlib.
+
+The Monte Carlo test doubles as a long-running workload: python sha256cavp.py --monte-only reports the hashes per
+second of every engine over the full run (--checkpoints N shortens it).
+
+Run with: python sha256cavp.py [--engines SHA256Int hashlib.sha256] [--checkpoints N] [--vectors DIR]
+'''
+
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+from sha256 import SHA256, SHA256Hash, SHA256Int
+
+VECTOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cavp')
+MESSAGE_FILES = ('SHA256ShortMsg.rsp', 'SHA256LongMsg.rsp')
+MONTE_FILE = 'SHA256Monte.rsp'
+# Monte Carlo test: checkpoints of ITERATIONS chained hashes each
+CHECKPOINTS = 100
+ITERATIONS = 1000
+
+
+def _reference(data):
+    return bytes.fromhex(SHA256(data).hexdigest())
+
+
+def _unrolled(data):
+    import sha256unrolled
+    return bytes.fromhex(sha256unrolled.SHA256Unrolled(data).generate_hash())
+
+
+def _batch(data):
+    import sha256batch
+    return sha256batch.batch_digest([data])[0]
+
+
+def _family(data):
+    import sha256family
+    return sha256family.sha256(data).digest()
+
+
+def _backend(data):
+    import sha256backend
+    return sha256backend.digest(data)
+
+
+# name -> function returning the 32 byte digest of a bytes message
+ENGINES = {
+    'SHA256': _reference,
+    'SHA256Int': lambda data: bytes.fromhex(SHA256Int(data).generate_hash()),
+    'SHA256Hash': lambda data: SHA256Hash(data).digest(),
+    'SHA256Unrolled': _unrolled,
+    'sha256batch': _batch,
+    'sha256family': _family,
+    'sha256backend': _backend,
+    'hashlib.sha256': lambda data: hashlib.sha256(data).digest(),
+}
+
+
+def available_engines():
+    """Names of the engines that can be imported here (sha256batch needs numpy)"""
+    names = []
+    for name, func in ENGINES.items():
+        try:
+            func(b'')
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def read_records(path):
+    """
+    Parse a CAVP .rsp file: yield each record (consecutive 'name = value' lines, ended by a blank line) as a
+    dictionary.  Comments (#) and section headers such as [L = 32] are skipped
+    """
+    record = {}
+    with open(path, encoding='ascii') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                if record:
+                    yield record
+                record = {}
+            elif not line.startswith(('#', '[')):
+                name, _, value = line.partition('=')
+                record[name.strip()] = value.strip()
+    if record:
+        yield record
+
+
+def read_messages(path):
+    """Return the (message, digest) pairs of a ShortMsg or LongMsg file.  Len is in bits, and the empty message is
+    written Msg = 00"""
+    vectors = []
+    for record in read_records(path):
+        message = bytes.fromhex(record['Msg'])[:int(record['Len']) // 8]
+        vectors.append((message, bytes.fromhex(record['MD'])))
+    return vectors
+
+
+def read_monte(path):
+    """Return the seed and the list of checkpoint digests of a Monte Carlo file"""
+    records = list(read_records(path))
+    seed = bytes.fromhex(records[0]['Seed'])
+    return seed, [bytes.fromhex(record['MD']) for record in records if 'MD' in record]
+
+
+def monte_carlo(digest, seed, checkpoints=CHECKPOINTS, iterations=ITERATIONS):
+    """
+    Yield the checkpoint digests of the SHAVS Monte Carlo test: starting from MD0 = MD1 = MD2 = seed, each hash is of
+    the concatenation of the previous three, M(i) = MD(i-3) || MD(i-2) || MD(i-1), and after iterations hashes the
+    last one is the checkpoint and the seed of the next
+    """
+    for _ in range(checkpoints):
+        md0 = md1 = md2 = seed
+        for _ in range(iterations):
+            md0, md1, md2 = md1, md2, digest(md0 + md1 + md2)
+        seed = md2
+        yield seed
+
+
+class Result:
+    """Outcome of one vector file against one engine: vectors passed and failed (their indexes), and seconds taken"""
+
+    def __init__(self, engine, vectors, passed, failed, seconds, hashes):
+        self.engine = engine
+        self.vectors = vectors
+        self.passed = passed
+        self.failed = failed
+        self.seconds = seconds
+        # number of messages hashed, for the throughput of the run
+        self.hashes = hashes
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def line(self):
+        status = 'PASS' if self.ok else f"FAIL (vectors {', '.join(map(str, self.failed[:10]))})"
+        return (f"{self.engine} {self.vectors}: {status} {self.passed}/{self.passed + len(self.failed)} "
+                f"in {self.seconds:.2f}s ({self.hashes / self.seconds:.0f} hashes/s)")
+
+
+def check_messages(engine, path, limit=None):
+    """Hash every message of a ShortMsg/LongMsg file (the first limit ones if given) and compare the digests"""
+    vectors = read_messages(path)[:limit]
+    digest = ENGINES[engine]
+    passed, failed = 0, []
+    start = time.perf_counter()
+    for index, (message, expected) in enumerate(vectors):
+        if digest(message) == expected:
+            passed += 1
+        else:
+            failed.append(index)
+    return Result(engine, os.path.basename(path), passed, failed, time.perf_counter() - start, len(vectors))
+
+
+def check_monte(engine, path, checkpoints=None):
+    """Run the Monte Carlo test of a Monte file (its first checkpoints checkpoints if given) and compare them"""
+    seed, expected = read_monte(path)
+    expected = expected[:checkpoints]
+    passed, failed = 0, []
+    start = time.perf_counter()
+    for index, (md, want) in enumerate(zip(monte_carlo(ENGINES[engine], seed, len(expected)), expected)):
+        if md == want:
+            passed += 1
+        else:
+            failed.append(index)
+    return Result(engine, os.path.basename(path), passed, failed, time.perf_counter() - start,
+                  len(expected) * ITERATIONS)
+
+
+def run(engines=None, vector_dir=VECTOR_DIR, checkpoints=None, messages=True, monte=True):
+    """Run the vector files against the engines (default: every available engine), yielding a Result per file"""
+    for engine in engines or available_engines():
+        if messages:
+            for name in MESSAGE_FILES:
+                yield check_messages(engine, os.path.join(vector_dir, name))
+        if monte:
+            yield check_monte(engine, os.path.join(vector_dir, MONTE_FILE), checkpoints)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sha256cavp', description='Run the CAVP SHA-256 vectors and Monte Carlo test '
+                                                                    'against every engine')
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=None,
+                        help='engines to test (default: every available engine)')
+    parser.add_argument('--checkpoints', type=int, default=None,
+                        help=f'Monte Carlo checkpoints to run (default: all {CHECKPOINTS})')
+    parser.add_argument('--vectors', default=VECTOR_DIR, help='directory of the .rsp files')
+    parser.add_argument('--monte-only', action='store_true', help='skip the ShortMsg and LongMsg files')
+    args = parser.parse_args(argv)
+    ok = True
+    for result in run(args.engines, args.vectors, args.checkpoints, messages=not args.monte_only):
+        print(result.line(), flush=True)
+        ok = ok and result.ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
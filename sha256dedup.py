@@ -0,0 +1,225 @@
+'''
+Content-defined chunking and a deduplicating chunk store keyed by SHA-256.
+
+chunk_stream cuts a stream into chunks where a gear rolling hash of the last bytes matches a mask (FastCDC): the
+boundaries depend on the content around them rather than on offsets, so an insertion or deletion only changes the
+chunks it touches and the rest of a file chunks exactly as before.  Chunks are at least min_size and at most
+max_size bytes; a stricter mask before avg_size and a looser one after it keep most chunks close to avg_size.
+
+ChunkStore keeps every chunk once, under its SHA-256 (hashed by sha256backend), in fan-out directories
+(root/ab/cd/abcd...).  Storing a file returns its recipe, the list of (digest, length) of its chunks, and writes only
+the chunks the store does not have yet.
+
+Run with: python sha256dedup.py store STORE FILE > RECIPE
+          python sha256dedup.py restore STORE RECIPE OUTPUT
+'''
+
+
+import argparse
+import os
+import random
+import struct
+import sys
+
+import sha256backend
+
+MIN_SIZE = 2 << 10
+AVG_SIZE = 8 << 10
+MAX_SIZE = 64 << 10
+READ_SIZE = 1 << 20
+MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+# random 64-bit value per byte value, fixed so that chunk boundaries are the same in every run
+GEAR = struct.unpack('>256Q', random.Random(0x6a09e667).randbytes(256 * 8))
+
+
+def masks(avg_size):
+    """
+    Boundary masks for an average chunk size (a power of 2): a cut is made where hash & mask == 0.  The gear hash
+    shifts left once per byte, so its high bits depend on the most bytes and the masks select high bits.  The mask
+    used before avg_size has 2 bits more than log2(avg_size), the one after 2 bits fewer (normalized chunking)
+    """
+    bits = avg_size.bit_length() - 1
+    return ((1 << (bits + 2)) - 1) << (62 - bits), ((1 << (bits - 2)) - 1) << (66 - bits)
+
+
+def find_boundary(data, start, end, min_size=MIN_SIZE, avg_size=AVG_SIZE, max_size=MAX_SIZE, gear=GEAR):
+    """
+    Return the end of the chunk starting at data[start], looking no further than end: the first offset after min_size
+    bytes where the rolling hash matches the mask, or start + max_size, or end if neither comes first
+    """
+    if end - start <= min_size:
+        return end
+    strict, loose = masks(avg_size)
+    normal = min(start + avg_size, end)
+    limit = min(start + max_size, end)
+    h = 0
+    i = start + min_size
+    while i < normal:
+        h = ((h << 1) + gear[data[i]]) & MASK_64
+        i += 1
+        if not h & strict:
+            return i
+    while i < limit:
+        h = ((h << 1) + gear[data[i]]) & MASK_64
+        i += 1
+        if not h & loose:
+            return i
+    return limit
+
+
+def chunk_stream(f, min_size=MIN_SIZE, avg_size=AVG_SIZE, max_size=MAX_SIZE, read_size=READ_SIZE):
+    """Yield the content-defined chunks (bytes) of the binary file object f, reading read_size bytes at a time"""
+    if not 0 < min_size < avg_size < max_size:
+        raise ValueError('chunk sizes must satisfy 0 < min_size < avg_size < max_size')
+    buffer = b''
+    eof = False
+    while True:
+        # keep at least one maximum chunk buffered, so a boundary is never cut short by the end of a read
+        while not eof and len(buffer) < max_size:
+            data = f.read(max(read_size, max_size))
+            eof = not data
+            buffer += data
+        if not buffer:
+            return
+        start = 0
+        while len(buffer) - start >= max_size or (eof and start < len(buffer)):
+            end = find_boundary(buffer, start, len(buffer), min_size, avg_size, max_size)
+            yield buffer[start:end]
+            start = end
+        buffer = buffer[start:]
+
+
+def chunk_bytes(data, min_size=MIN_SIZE, avg_size=AVG_SIZE, max_size=MAX_SIZE):
+    """Return the list of content-defined chunks of data"""
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = find_boundary(data, start, len(data), min_size, avg_size, max_size)
+        chunks.append(data[start:end])
+        start = end
+    return chunks
+
+
+class StoreStats:
+    """Chunks and bytes seen by a ChunkStore, and how many of them were new (written)"""
+
+    def __init__(self):
+        self.chunks = 0
+        self.new_chunks = 0
+        self.bytes = 0
+        self.new_bytes = 0
+
+    @property
+    def dedup_ratio(self):
+        """Bytes seen per byte written (1.0 when nothing was deduplicated)"""
+        if not self.new_bytes:
+            return float('inf') if self.bytes else 1.0
+        return self.bytes / self.new_bytes
+
+
+class ChunkStore:
+    """
+    Content-addressed store of chunks under root: the chunk with digest abcd... is the file root/ab/cd/abcd...
+    (levels directory levels of 2 hex digits).  Chunks are written to a temporary file and renamed into place, so a
+    chunk file is either complete or absent
+    """
+
+    def __init__(self, root, levels=2, min_size=MIN_SIZE, avg_size=AVG_SIZE, max_size=MAX_SIZE):
+        self.root = root
+        self.levels = levels
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.stats = StoreStats()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        """Path of the chunk with the hex digest"""
+        return os.path.join(self.root, *(digest[2 * i:2 * i + 2] for i in range(self.levels)), digest)
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, chunk):
+        """Store chunk unless it is already there, return its hex digest"""
+        digest = sha256backend.hexdigest(chunk)
+        path = self.path(digest)
+        self.stats.chunks += 1
+        self.stats.bytes += len(chunk)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(chunk)
+            os.replace(temporary, path)
+            self.stats.new_chunks += 1
+            self.stats.new_bytes += len(chunk)
+        return digest
+
+    def get(self, digest):
+        """Return the chunk with the hex digest, checking it still hashes to the digest (raises KeyError if missing,
+        ValueError if corrupt)"""
+        try:
+            with open(self.path(digest), 'rb') as f:
+                chunk = f.read()
+        except FileNotFoundError:
+            raise KeyError(digest) from None
+        if sha256backend.hexdigest(chunk) != digest:
+            raise ValueError(f'chunk {digest} is corrupt')
+        return chunk
+
+    def store(self, f):
+        """Chunk the binary file object f into the store, return its recipe: the list of (hex digest, length)"""
+        return [(self.put(chunk), len(chunk))
+                for chunk in chunk_stream(f, self.min_size, self.avg_size, self.max_size)]
+
+    def store_file(self, path):
+        with open(path, 'rb') as f:
+            return self.store(f)
+
+    def restore(self, recipe, f):
+        """Write the chunks of recipe to the binary file object f"""
+        for digest, _ in recipe:
+            f.write(self.get(digest))
+
+
+def format_recipe(recipe):
+    return ''.join(f'{digest} {length}\n' for digest, length in recipe)
+
+
+def read_recipe(f):
+    recipe = []
+    for line in f:
+        digest, length = line.split()
+        recipe.append((digest, int(length)))
+    return recipe
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sha256dedup', description='Deduplicating SHA-256 chunk store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    store = commands.add_parser('store', help='add FILE to STORE and print its recipe')
+    store.add_argument('store', metavar='STORE')
+    store.add_argument('file', metavar='FILE')
+    restore = commands.add_parser('restore', help='rebuild OUTPUT from the chunks of RECIPE')
+    restore.add_argument('store', metavar='STORE')
+    restore.add_argument('recipe', metavar='RECIPE')
+    restore.add_argument('output', metavar='OUTPUT')
+    args = parser.parse_args(argv)
+    chunks = ChunkStore(args.store)
+    if args.command == 'store':
+        sys.stdout.write(format_recipe(chunks.store_file(args.file)))
+        stats = chunks.stats
+        print(f'sha256dedup: {stats.chunks} chunks, {stats.new_chunks} new ({stats.new_bytes} of {stats.bytes} bytes '
+              f'written)', file=sys.stderr)
+        return 0
+    with open(args.recipe) as f:
+        recipe = read_recipe(f)
+    with open(args.output, 'wb') as f:
+        chunks.restore(recipe, f)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+'''
+The SHA-2 family (FIPS 180-4) from one engine: SHA-224, SHA-256, SHA-384, SHA-512, SHA-512/224 and SHA-512/256.
+
+The functions only differ in their parameters, collected in a Variant: the word size (32 or 64 bits, which also
+sets the block size and the width of the length field), the number of rounds (64 or 80), the rotation and shift
+amounts of the four mixing functions, the initial hash values and the digest length.  The round constants and
+initial hash values are derived the same way as sha256.HASH_VALUES and sha256.ROUND_CONSTANTS (fractional parts of
+the roots of the first primes), and the SHA-512/t initial values with the IV generation function of FIPS 180-4 5.3.6.
+
+On 64-bit hosts SHA-512 and SHA-512/256 compress 128 bytes per block in 80 rounds against 64 bytes in 64 rounds,
+so they are faster than SHA-256 on long messages (see python sha256bench.py family).  Hashers are created by
+hashlib name, e.g. new('sha512_256', data), or with the constructors sha224() ... sha512_256().
+'''
+
+
+import struct
+
+from sha256 import fractional_bits, get_primes
+
+PRIMES = tuple(get_primes(80))
+
+
+class Variant:
+    """
+    Parameters of one SHA-2 function.  rotations are the (rotate, rotate, shift) amounts of sigma_0 and sigma_1
+    (message schedule) and the (rotate, rotate, rotate) amounts of epsilon_0 and epsilon_1 (rounds), see SHA256
+    """
+
+    def __init__(self, name, word_bits, rounds, rotations, iv, digest_size):
+        self.name = name
+        self.word_bits = word_bits
+        self.rounds = rounds
+        self.rotations = rotations
+        self.iv = tuple(iv)
+        self.digest_size = digest_size
+        self.mask = (1 << word_bits) - 1
+        self.block_size = 2 * word_bits
+        # the message length in bits is appended as a 2 word big-endian integer
+        self.length_size = word_bits // 4
+        self.word_format = '>16I' if word_bits == 32 else '>16Q'
+        self.state_format = '>8I' if word_bits == 32 else '>8Q'
+        self.k = tuple(fractional_bits(p, 3, word_bits) for p in PRIMES[:rounds])
+
+    def __repr__(self):
+        return f'Variant({self.name!r})'
+
+    def padding(self, length):
+        """Return the padding for a message of length bytes (see sha256.padding)"""
+        zeros = (self.block_size - self.length_size - 1 - length) % self.block_size
+        return b'\x80' + b'\x00' * zeros + ((length * 8) % (1 << 8 * self.length_size)).to_bytes(self.length_size, 'big')
+
+
+def compress(variant, state, words):
+    """
+    sha256.compress for any variant: compress one block (16 words) into the 8 hash values state and return the
+    updated hash values.  Rotations double each word into 2 * word_bits bits (x * (2^word_bits + 1)) so that every
+    right rotation is a single shift, and the bits above word_bits are masked off when a word is stored.
+    """
+    mask = variant.mask
+    double = mask + 2
+    (s0a, s0b, s0c), (s1a, s1b, s1c), (e0a, e0b, e0c), (e1a, e1b, e1c) = variant.rotations
+    w = list(words)
+    # extend the 16 words into the message schedule of one word per round
+    for i in range(16, variant.rounds):
+        x = w[i - 15]
+        y = w[i - 2]
+        xx = x * double
+        yy = y * double
+        w.append((w[i - 16] + w[i - 7] + ((xx >> s0a) ^ (xx >> s0b) ^ (x >> s0c)) + ((yy >> s1a) ^ (yy >> s1b) ^ (y >> s1c)))
+                 & mask)
+    a, b, c, d, e, f, g, h = state
+    for kj, wj in zip(variant.k, w):
+        ee = e * double
+        aa = a * double
+        temp1 = h + kj + wj + ((ee >> e1a) ^ (ee >> e1b) ^ (ee >> e1c)) + (g ^ (e & (f ^ g)))
+        temp2 = ((aa >> e0a) ^ (aa >> e0b) ^ (aa >> e0c)) + ((a & b) | (c & (a | b)))
+        h, g, f, e, d, c, b, a = g, f, e, (d + temp1) & mask, c, b, a, (temp1 + temp2) & mask
+    return [(x + y) & mask for x, y in zip(state, (a, b, c, d, e, f, g, h))]
+
+
+class SHA2Hash:
+    """
+    Incremental hasher for one SHA-2 variant, with the interface of hashlib (and of sha256.SHA256Hash): update(),
+    digest(), hexdigest() and copy()
+    """
+
+    def __init__(self, variant, data=b''):
+        self.variant = variant
+        self._h = variant.iv
+        self._buffer = b''
+        self._length = 0
+        if data:
+            self.update(data)
+
+    @property
+    def name(self):
+        return self.variant.name
+
+    @property
+    def digest_size(self):
+        return self.variant.digest_size
+
+    @property
+    def block_size(self):
+        return self.variant.block_size
+
+    def update(self, data):
+        """Hash the bytes-like data, continuing from the bytes already hashed"""
+        if isinstance(data, str):
+            raise TypeError('Strings must be encoded before hashing')
+        view = memoryview(data).cast('B')
+        variant = self.variant
+        size = variant.block_size
+        self._length += len(view)
+        h = self._h
+        start = 0
+        if self._buffer:
+            # top up the partial block left over from the last update first
+            start = size - len(self._buffer)
+            self._buffer += bytes(view[:start])
+            if len(self._buffer) < size:
+                return
+            h = compress(variant, h, struct.unpack(variant.word_format, self._buffer))
+        end = len(view) - (len(view) - start) % size
+        for offset in range(start, end, size):
+            h = compress(variant, h, struct.unpack_from(variant.word_format, view, offset))
+        self._h = h
+        self._buffer = bytes(view[end:])
+
+    def digest(self):
+        """Return the digest of the data passed to update so far"""
+        variant = self.variant
+        tail = self._buffer + variant.padding(self._length)
+        h = self._h
+        for offset in range(0, len(tail), variant.block_size):
+            h = compress(variant, h, struct.unpack_from(variant.word_format, tail, offset))
+        return struct.pack(variant.state_format, *h)[:variant.digest_size]
+
+    def hexdigest(self):
+        """Return the digest as a string of hex digits"""
+        return self.digest().hex()
+
+    def copy(self):
+        """Return a copy of the hasher"""
+        other = SHA2Hash.__new__(SHA2Hash)
+        other.variant = self.variant
+        other._h = self._h
+        other._buffer = self._buffer
+        other._length = self._length
+        return other
+
+
+ROTATIONS_32 = ((7, 18, 3), (17, 19, 10), (2, 13, 22), (6, 11, 25))
+ROTATIONS_64 = ((1, 8, 7), (19, 61, 6), (28, 34, 39), (14, 18, 41))
+# SHA-256 and SHA-512 start from the square roots of the first 8 primes, SHA-384 from those of the next 8, and
+# SHA-224 from the second 32 bits of the SHA-384 values
+SHA256 = Variant('sha256', 32, 64, ROTATIONS_32, (fractional_bits(p, 2) for p in PRIMES[:8]), 32)
+SHA224 = Variant('sha224', 32, 64, ROTATIONS_32, (fractional_bits(p, 2, 64) & 0xFFFFFFFF for p in PRIMES[8:16]), 28)
+SHA512 = Variant('sha512', 64, 80, ROTATIONS_64, (fractional_bits(p, 2, 64) for p in PRIMES[:8]), 64)
+SHA384 = Variant('sha384', 64, 80, ROTATIONS_64, (fractional_bits(p, 2, 64) for p in PRIMES[8:16]), 48)
+
+
+def truncated_variant(t):
+    """
+    SHA-512/t (t a multiple of 8 below 512, not 384): SHA-512 truncated to t bits, starting from initial hash values
+    of its own, the SHA-512 hash of the string 'SHA-512/t' computed from the SHA-512 values xor a5a5...a5
+    """
+    generator = Variant('sha512', 64, 80, ROTATIONS_64, (x ^ 0xa5a5a5a5a5a5a5a5 for x in SHA512.iv), 64)
+    hasher = SHA2Hash(generator, f'SHA-512/{t}'.encode('ascii'))
+    iv = struct.unpack('>8Q', hasher.digest())
+    return Variant(f'sha512_{t}', 64, 80, ROTATIONS_64, iv, t // 8)
+
+
+SHA512_224 = truncated_variant(224)
+SHA512_256 = truncated_variant(256)
+
+# hashlib names -> variant
+VARIANTS = {variant.name: variant for variant in (SHA224, SHA256, SHA384, SHA512, SHA512_224, SHA512_256)}
+
+
+def new(name, data=b''):
+    """Return a hasher for the variant with the hashlib name (sha224, sha256, sha384, sha512, sha512_224, sha512_256)"""
+    try:
+        variant = VARIANTS[name.lower().replace('-', '').replace('/', '_')]
+    except KeyError:
+        raise ValueError(f'unsupported hash type {name}') from None
+    return SHA2Hash(variant, data)
+
+
+def sha224(data=b''):
+    return SHA2Hash(SHA224, data)
+
+
+def sha256(data=b''):
+    return SHA2Hash(SHA256, data)
+
+
+def sha384(data=b''):
+    return SHA2Hash(SHA384, data)
+
+
+def sha512(data=b''):
+    return SHA2Hash(SHA512, data)
+
+
+def sha512_224(data=b''):
+    return SHA2Hash(SHA512_224, data)
+
+
+def sha512_256(data=b''):
+    return SHA2Hash(SHA512_256, data)
@@ -0,0 +1,118 @@
+'''
+HMAC-SHA256 (RFC 2104) and PBKDF2-HMAC-SHA256 (RFC 8018) built on the integer SHA-256 engine in sha256.py.
+
+The key is padded to one 64 byte block and XORed with ipad/opad, and those two blocks are compressed once per key.
+HMAC objects then copy the two midstates, and every PBKDF2 iteration is exactly two calls to compress: the 32 byte
+previous U plus a precomputed padding tail for the inner hash, and the 32 byte inner digest plus the same tail for the
+outer hash, with the words kept as ints the whole time.
+'''
+
+
+import struct
+
+from sha256 import HASH_VALUES, SHA256Hash, compress, padding
+
+BLOCK_SIZE = SHA256Hash.block_size
+DIGEST_SIZE = SHA256Hash.digest_size
+IPAD = bytes(0x36 for _ in range(BLOCK_SIZE))
+OPAD = bytes(0x5C for _ in range(BLOCK_SIZE))
+# padding words for the second block of a 96 byte message (one key block + one 32 byte digest): the 1 bit, zeros,
+# and the length 96 * 8 = 768 bits
+DIGEST_BLOCK_TAIL = (0x80000000, 0, 0, 0, 0, 0, 0, (BLOCK_SIZE + DIGEST_SIZE) * 8)
+
+
+def key_block(key):
+    """Pad the key to one block with zeros, hashing it first if it is longer than a block"""
+    if len(key) > BLOCK_SIZE:
+        key = SHA256Hash(key).digest()
+    return bytes(key) + bytes(BLOCK_SIZE - len(key))
+
+
+def xor_block(block, pad):
+    return bytes(x ^ y for x, y in zip(block, pad))
+
+
+class HMAC:
+    """HMAC-SHA256 with the same interface as hmac.HMAC: update, digest, hexdigest and copy"""
+    name = 'hmac-sha256'
+    digest_size = DIGEST_SIZE
+    block_size = BLOCK_SIZE
+
+    def __init__(self, key, msg=None):
+        block = key_block(key)
+        # the ipad and opad blocks are compressed once, here
+        self._inner = SHA256Hash(xor_block(block, IPAD))
+        self._outer = SHA256Hash(xor_block(block, OPAD))
+        if msg is not None:
+            self.update(msg)
+
+    def update(self, msg):
+        self._inner.update(msg)
+
+    def digest(self):
+        outer = self._outer.copy()
+        outer.update(self._inner.digest())
+        return outer.digest()
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+    def copy(self):
+        other = HMAC.__new__(HMAC)
+        other._inner = self._inner.copy()
+        other._outer = self._outer
+        return other
+
+
+def new(key, msg=None):
+    """Return a new HMAC object, like hmac.new(key, msg, 'sha256')"""
+    return HMAC(key, msg)
+
+
+def hmac_sha256(key, msg):
+    """Return the 32 byte HMAC-SHA256 of msg"""
+    return HMAC(key, msg).digest()
+
+
+def pad_states(key):
+    """Hash values after compressing the key block XOR ipad and XOR opad: the HMAC inner and outer midstates"""
+    block = key_block(key)
+    inner = compress(HASH_VALUES, struct.unpack('>16I', xor_block(block, IPAD)))
+    outer = compress(HASH_VALUES, struct.unpack('>16I', xor_block(block, OPAD)))
+    return inner, outer
+
+
+def finish(state, data):
+    """Hash values after data and its padding, continuing from a midstate that has compressed one key block"""
+    data = bytes(data) + padding(BLOCK_SIZE + len(data))
+    for offset in range(0, len(data), BLOCK_SIZE):
+        state = compress(state, struct.unpack_from('>16I', data, offset))
+    return state
+
+
+def pbkdf2_hmac(password, salt, iterations, dklen=None):
+    """
+    PBKDF2-HMAC-SHA256, same result as hashlib.pbkdf2_hmac('sha256', password, salt, iterations, dklen).
+    The inner and outer midstates are computed once.  The first U of each output block hashes salt || block index
+    from the inner midstate, every following U is two compressions of one block each.
+    """
+    if iterations < 1:
+        raise ValueError('iterations must be at least 1')
+    if dklen is None:
+        dklen = DIGEST_SIZE
+    if dklen < 1:
+        raise ValueError('dklen must be at least 1')
+    inner, outer = pad_states(password)
+    tail = list(DIGEST_BLOCK_TAIL)
+    salt = bytes(salt)
+    output = b''
+    index = 1
+    while len(output) < dklen:
+        u = compress(outer, finish(inner, salt + struct.pack('>I', index)) + tail)
+        result = u
+        for _ in range(iterations - 1):
+            u = compress(outer, compress(inner, u + tail) + tail)
+            result = [x ^ y for x, y in zip(result, u)]
+        output += struct.pack('>8I', *result)
+        index += 1
+    return output[:dklen]
@@ -0,0 +1,135 @@
+'''
+Persistent on-disk digest index for files, in front of sha256.hash_file.
+
+Digests are stored in an SQLite database keyed by (device, inode, size, mtime_ns), so a file that has not changed
+since it was last hashed returns its stored digest without being read.  The index keeps at most max_entries digests,
+evicting the least recently used ones.  Lookups only read: the times digests were last used are written in batches
+of TOUCH_BATCH (and before evicting, and on close), so hits don't take the write lock.  Each DigestIndex keeps a
+running count of the entries instead of counting them on every store; it counts again only when the running count
+passes max_entries, so processes sharing an index can go over max_entries by the entries the others added since.
+SQLite in WAL mode with a busy timeout makes the index safe to share between
+processes (for example the workers of sha256manifest.hash_tree), each one opening its own DigestIndex.
+'''
+
+
+import os
+import sqlite3
+import time
+
+from sha256 import hash_file
+
+MAX_ENTRIES = 1000000
+# lookups whose recency update is held back before they are written in one transaction
+TOUCH_BATCH = 256
+# evicting makes room for max_entries // EVICT_SLACK more digests
+EVICT_SLACK = 100
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS digests (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (device, inode, size, mtime_ns)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS digests_used ON digests (used);
+'''
+
+
+def file_key(stat_result):
+    """Index key of a file: (device, inode, size, mtime_ns) from its os.stat result"""
+    return stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns
+
+
+class DigestIndex:
+    """
+    SQLite-backed digest cache.  digest(path) returns the 32 byte SHA-256 of the file, from the index when the file's
+    key is stored and by hashing the file otherwise.
+    """
+
+    def __init__(self, path, max_entries=MAX_ENTRIES, timeout=30.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connection = sqlite3.connect(path, timeout=timeout)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+        # entries in the index as far as this object knows: counted on open and after evicting, plus every store since
+        self._count = len(self)
+        # key -> time of the lookups not yet written to the used column
+        self._touched = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM digests').fetchone()[0]
+
+    def close(self):
+        with self._connection:
+            self._write_touched()
+        self._connection.close()
+
+    def _write_touched(self):
+        """Write the held back recency updates, inside the caller's transaction"""
+        if self._touched:
+            self._connection.executemany('UPDATE digests SET used = ? WHERE device = ? AND inode = ? AND size = ? '
+                                         'AND mtime_ns = ?', [(used,) + key for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def lookup(self, stat_result):
+        """Return the stored digest for a file's os.stat result (marking it as recently used), or None"""
+        key = file_key(stat_result)
+        row = self._connection.execute('SELECT digest FROM digests WHERE device = ? AND inode = ? AND size = ? '
+                                       'AND mtime_ns = ?', key).fetchone()
+        if row is None:
+            return None
+        self._touched[key] = time.time_ns()
+        if len(self._touched) >= TOUCH_BATCH:
+            with self._connection:
+                self._write_touched()
+        return row[0]
+
+    def store(self, stat_result, digest):
+        """Store the digest of a file, evicting the least recently used digests beyond max_entries"""
+        with self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)',
+                                     file_key(stat_result) + (digest, time.time_ns()))
+            self._count += 1
+            if self._count <= self.max_entries:
+                return
+            # the running count may be high (replaced digests) or low (other processes), count before evicting.
+            # Evicting 1% more than needed leaves room for the next stores before counting again
+            self._write_touched()
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                excess += self.max_entries // EVICT_SLACK
+            if excess > 0:
+                self._connection.execute('DELETE FROM digests WHERE (device, inode, size, mtime_ns) IN (SELECT '
+                                         'device, inode, size, mtime_ns FROM digests ORDER BY used LIMIT ?)',
+                                         (excess,))
+            self._count = len(self)
+
+    def digest(self, path):
+        """Return the 32 byte digest of the file at path, reading the file only if it is not in the index"""
+        before = os.stat(path)
+        digest = self.lookup(before)
+        if digest is not None:
+            self.hits += 1
+            return digest
+        self.misses += 1
+        digest = hash_file(path).digest()
+        # only store the digest if the file did not change while it was being hashed
+        if file_key(os.stat(path)) == file_key(before):
+            self.store(before, digest)
+        return digest
+
+    def hexdigest(self, path):
+        return self.digest(path).hex()
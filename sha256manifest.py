@@ -0,0 +1,237 @@
+'''
+Directory tree hashing with a process pool, built on sha256.hash_file.
+
+Files are sent to a ProcessPoolExecutor sized by file: large files are one task each, small files are batched into one
+task until the batch reaches BATCH_BYTES or BATCH_FILES, so each task costs about the same and IPC is amortized.
+Results are sorted by path, so manifests are deterministic whatever order the workers finish in.
+
+Only regular files are hashed: symbolic links (to files or to directories) are skipped rather than followed, so a tree
+hashes the same whatever its links point to.
+
+Manifests use the sha256sum format with paths relative to the root (so `python -m sha256 --check MANIFEST` works from
+the root directory too).
+
+Run with: python sha256manifest.py create ROOT [-o MANIFEST]
+          python sha256manifest.py verify ROOT MANIFEST
+'''
+
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from sha256 import CHECK_LINE, escape_name, hash_file, unescape_name
+from sha256index import DigestIndex
+
+# small files are batched into one task until the batch holds this many bytes or this many files
+BATCH_BYTES = 4 << 20
+BATCH_FILES = 256
+
+
+def walk_files(root):
+    """
+    Return a sorted list of (relative path, size) for every regular file under root, paths use '/' as the separator.
+    Symbolic links are skipped whatever they point to (files, directories or nothing), as are sockets, FIFOs and
+    devices: they are neither followed nor listed.
+    """
+    files = []
+    directories = ['']
+    while directories:
+        directory = directories.pop()
+        with os.scandir(os.path.join(root, directory)) as entries:
+            for entry in entries:
+                path = directory + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(path + '/')
+                elif entry.is_file(follow_symlinks=False):
+                    # files that can't be stat-ed are still listed, hashing them reports the error
+                    try:
+                        size = entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        size = 0
+                    files.append((path, size))
+    return sorted(files)
+
+
+def plan_tasks(files, batch_bytes=BATCH_BYTES, batch_files=BATCH_FILES):
+    """Split (path, size) pairs into tasks (lists of paths): one task per large file, small files batched together"""
+    tasks = []
+    batch = []
+    batch_size = 0
+    for path, size in files:
+        if size >= batch_bytes:
+            tasks.append([path])
+            continue
+        batch.append(path)
+        batch_size += size
+        if batch_size >= batch_bytes or len(batch) >= batch_files:
+            tasks.append(batch)
+            batch = []
+            batch_size = 0
+    if batch:
+        tasks.append(batch)
+    return tasks
+
+
+def hash_task(root, paths, index_path=None):
+    """
+    Worker task: hash each path under root, returning (path, hex digest, None) or (path, None, error message).
+    With index_path, digests of unchanged files come from that sha256index.DigestIndex instead of reading them.
+    """
+    index = DigestIndex(index_path) if index_path else None
+    results = []
+    try:
+        for path in paths:
+            try:
+                if index is None:
+                    digest = hash_file(os.path.join(root, path)).hexdigest()
+                else:
+                    digest = index.hexdigest(os.path.join(root, path))
+                results.append((path, digest, None))
+            except OSError as error:
+                results.append((path, None, error.strerror or str(error)))
+    finally:
+        if index is not None:
+            index.close()
+    return results
+
+
+def hash_tree(root, paths=None, workers=None, index_path=None, batch_bytes=BATCH_BYTES, batch_files=BATCH_FILES,
+              exclude=()):
+    """
+    Hash every regular file under root (see walk_files), or only the given relative paths, and return (digests,
+    errors): two dicts sorted by path, mapping path to hex digest and path to error message.  workers defaults to the number of CPUs, with
+    workers=1 the files are hashed in this process.  index_path is an optional persistent digest index (see
+    sha256index) that unchanged files are looked up in.  batch_bytes and batch_files are passed to plan_tasks.
+    Relative paths in exclude (such as the manifest being written) are left out.
+    """
+    files = walk_files(root) if paths is None else [(path, _size(root, path)) for path in sorted(paths)]
+    files = [(path, size) for path, size in files if path not in exclude]
+    tasks = plan_tasks(files, batch_bytes, batch_files)
+    if workers == 1 or len(tasks) <= 1:
+        results = [hash_task(root, task, index_path) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(hash_task, [root] * len(tasks), tasks, [index_path] * len(tasks)))
+    digests = {}
+    errors = {}
+    for path, digest, error in sorted(result for task_results in results for result in task_results):
+        if error is None:
+            digests[path] = digest
+        else:
+            errors[path] = error
+    return digests, errors
+
+
+def _size(root, path):
+    try:
+        return os.stat(os.path.join(root, path)).st_size
+    except OSError:
+        return 0
+
+
+def relative_name(root, path):
+    """path relative to root with '/' separators, as manifests list it"""
+    return os.path.relpath(os.path.abspath(path), os.path.abspath(root)).replace(os.sep, '/')
+
+
+def format_manifest(digests):
+    """Return the sha256sum-format manifest text for a dict of path to hex digest, sorted by path"""
+    lines = []
+    for path in sorted(digests):
+        escaped, name = escape_name(path)
+        lines.append(f"{escaped}{digests[path]}  {name}\n")
+    return ''.join(lines)
+
+
+def write_manifest(root, manifest_path, workers=None, index_path=None):
+    """
+    Hash the tree under root and write its manifest, leaving out the manifest itself if it is under root.  Returns
+    the errors dict of files that could not be hashed
+    """
+    digests, errors = hash_tree(root, workers=workers, index_path=index_path,
+                                exclude={relative_name(root, manifest_path)})
+    with open(manifest_path, 'w', encoding='utf-8', errors='surrogateescape') as f:
+        f.write(format_manifest(digests))
+    return errors
+
+
+def read_manifest(manifest_path):
+    """Read a sha256sum-format manifest into a dict of path to hex digest"""
+    digests = {}
+    with open(manifest_path, encoding='utf-8', errors='surrogateescape') as f:
+        for number, line in enumerate(f, 1):
+            match = CHECK_LINE.match(line.rstrip('\n'))
+            if not match:
+                raise ValueError(f"{manifest_path}:{number}: improperly formatted manifest line")
+            escaped, digest, _, path = match.groups()
+            digests[unescape_name(path) if escaped else path] = digest.lower()
+    return digests
+
+
+class VerifyReport:
+    """Result of verify_manifest: paths that matched, mismatched, could not be read, and files not in the manifest"""
+
+    def __init__(self, matched, mismatched, errors, extra):
+        self.matched = matched
+        self.mismatched = mismatched
+        # path -> error message, for files in the manifest that could not be hashed (missing, unreadable...)
+        self.errors = errors
+        self.extra = extra
+
+    @property
+    def ok(self):
+        """True if every file in the manifest matched and no file was added to the tree"""
+        return not (self.mismatched or self.errors or self.extra)
+
+    def lines(self):
+        """Per-file report lines, sorted by path"""
+        status = {path: 'OK' for path in self.matched}
+        status.update((path, 'FAILED') for path in self.mismatched)
+        status.update((path, f'FAILED open or read ({error})') for path, error in self.errors.items())
+        status.update((path, 'NOT IN MANIFEST') for path in self.extra)
+        return [f"{path}: {status[path]}" for path in sorted(status)]
+
+
+def verify_manifest(root, manifest_path, workers=None):
+    """Re-hash the files listed in the manifest (and look for files added to the tree) and return a VerifyReport"""
+    expected = read_manifest(manifest_path)
+    digests, errors = hash_tree(root, paths=expected, workers=workers)
+    manifest_name = relative_name(root, manifest_path)
+    extra = [path for path, _ in walk_files(root) if path not in expected and path != manifest_name]
+    matched = [path for path, digest in digests.items() if digest == expected[path]]
+    mismatched = [path for path, digest in digests.items() if digest != expected[path]]
+    return VerifyReport(matched, mismatched, errors, extra)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sha256manifest', description='Create or verify a SHA-256 manifest of a '
+                                                                        'directory tree.')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: CPUs)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help='hash every file under ROOT and write the manifest')
+    create.add_argument('root', metavar='ROOT')
+    create.add_argument('-o', '--output', default='-', help='manifest file (default: standard output)')
+    create.add_argument('--index', default=None, help='persistent digest index, unchanged files are not re-read')
+    verify = commands.add_parser('verify', help='check the files under ROOT against MANIFEST')
+    verify.add_argument('root', metavar='ROOT')
+    verify.add_argument('manifest', metavar='MANIFEST')
+    args = parser.parse_args(argv)
+    if args.command == 'create':
+        if args.output == '-':
+            digests, errors = hash_tree(args.root, workers=args.workers, index_path=args.index)
+            sys.stdout.write(format_manifest(digests))
+        else:
+            errors = write_manifest(args.root, args.output, workers=args.workers, index_path=args.index)
+        for path, error in errors.items():
+            print(f"sha256manifest: {path}: {error}", file=sys.stderr)
+        return 1 if errors else 0
+    report = verify_manifest(args.root, args.manifest, workers=args.workers)
+    for line in report.lines():
+        print(line)
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+'''
+Incremental Merkle index of a file, for files modified in place (databases, disk images) whose digest is wanted after
+every few changed pages.
+
+The index keeps every level of the sha256treehash tree of the file (leaf digests, interior nodes, top digest), plus a
+CRC-32 of every leaf, in a fixed layout file next to it (FILE.merkle by default):
+
+    header:  b'SHA256MK', index version (1 byte), leaf_size (8 bytes), fanout (4 bytes), file length (8 bytes)
+    CRC-32 of each leaf (4 bytes each)
+    level 0 (leaf digests), level 1, ... up to the single top digest (32 bytes each)
+
+The index file is memory-mapped, so an update reads and writes only the nodes it touches.  update(changes) re-hashes
+only the leaves overlapping the (offset, length) ranges the caller reports, then only the nodes on their paths to the
+top: with 4 KB leaves and a fan-out of 16, a change in a 1 GB file costs one leaf and 5 interior hashes.  update()
+without a change list reads the whole file but only computes CRC-32s (C speed), and re-hashes the leaves whose CRC
+differs; it trusts CRC-32 to notice changes, which holds for accidental changes but not for adversarial ones (use
+build() to re-hash everything).  A file that changed length is re-scanned and the index rewritten.  Runs of identical
+leaves, such as the zero pages of disk images and sparse files, are hashed once when the index is built.
+
+root() is the same digest as sha256treehash.tree_hash_file(path, leaf_size, fanout).
+
+Run with: python sha256merkle.py [--leaf-size BYTES] [--fanout N] [--changed OFFSET:LENGTH]... FILE
+'''
+
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from sha256 import SHA256Hash
+from sha256treehash import (FANOUT, INTERIOR_PREFIX, LEAF_PREFIX, ROOT_PREFIX, TREE_VERSION, check_params,
+                            leaf_count)
+
+INDEX_MAGIC = b'SHA256MK'
+INDEX_VERSION = 1
+HEADER = struct.Struct('>8sBQIQ')
+# one page: the unit databases and disk images change in
+LEAF_SIZE = 4096
+DIGEST_SIZE = 32
+
+
+def level_sizes(count, fanout):
+    """Number of nodes in each level of the tree over count leaves, from the leaves up to the single top node"""
+    sizes = [count]
+    while sizes[-1] > 1:
+        sizes.append(-(-sizes[-1] // fanout))
+    return sizes
+
+
+def leaf_digest(leaf):
+    """Leaf digest in the sha256treehash format"""
+    hasher = SHA256Hash(LEAF_PREFIX)
+    hasher.update(leaf)
+    return hasher.digest()
+
+
+class MerkleIndex:
+    """
+    Merkle index of the file at path, stored at index_path (default: path + '.merkle').  An existing index with the
+    same leaf size and fan-out is opened as it is (call update to bring it up to date), otherwise the file is hashed
+    and the index built
+    """
+
+    def __init__(self, path, index_path=None, leaf_size=LEAF_SIZE, fanout=FANOUT):
+        check_params(leaf_size, fanout)
+        self.path = path
+        self.index_path = index_path or path + '.merkle'
+        self.leaf_size = leaf_size
+        self.fanout = fanout
+        self._index = None
+        # leaves and nodes re-hashed by the last build or update
+        self.leaves_hashed = 0
+        self.nodes_hashed = 0
+        # True if the index did not exist (or did not match) and was built from the file
+        self.created = not self._open()
+        if self.created:
+            self.build()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._index is not None:
+            self._index.flush()
+            self._index.close()
+            self._index = None
+
+    def _layout(self, length):
+        self.length = length
+        self.count = leaf_count(length, self.leaf_size)
+        self.sizes = level_sizes(self.count, self.fanout)
+        # byte offset of each level in the index file
+        self.offsets = []
+        offset = HEADER.size + 4 * self.count
+        for size in self.sizes:
+            self.offsets.append(offset)
+            offset += DIGEST_SIZE * size
+        return offset
+
+    def _open(self):
+        """Map an existing index with the same parameters, return False if there is none"""
+        try:
+            f = open(self.index_path, 'r+b')
+        except FileNotFoundError:
+            return False
+        with f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return False
+            magic, version, leaf_size, fanout, length = HEADER.unpack(header)
+            if (magic, version, leaf_size, fanout) != (INDEX_MAGIC, INDEX_VERSION, self.leaf_size, self.fanout):
+                return False
+            if os.fstat(f.fileno()).st_size != self._layout(length):
+                return False
+            self._index = mmap.mmap(f.fileno(), 0)
+        return True
+
+    def node(self, level, i):
+        """Digest of node i of level (level 0 are the leaves)"""
+        offset = self.offsets[level] + DIGEST_SIZE * i
+        return self._index[offset:offset + DIGEST_SIZE]
+
+    def crc(self, i):
+        """CRC-32 of leaf i"""
+        return struct.unpack_from('>I', self._index, HEADER.size + 4 * i)[0]
+
+    def root(self):
+        """The 32 byte root digest, sha256treehash.tree_hash_file of the file when the index is up to date"""
+        root = SHA256Hash(ROOT_PREFIX + struct.pack('>BQIQ', TREE_VERSION, self.leaf_size, self.fanout, self.length))
+        root.update(self.node(len(self.sizes) - 1, 0))
+        return root.digest()
+
+    def hexdigest(self):
+        return self.root().hex()
+
+    def _leaves(self, view):
+        """Yield (CRC-32, bytes-like) of every leaf of a view of the whole file"""
+        for i in range(self.count):
+            leaf = view[i * self.leaf_size:(i + 1) * self.leaf_size]
+            yield zlib.crc32(leaf), leaf
+
+    def _scan(self, reuse=None):
+        """
+        Read the whole file, return the lists of leaf CRC-32s and leaf digests.  reuse(i, crc) returns the known digest
+        of leaf i if its CRC-32 says it did not change, or None.  A leaf identical to the one before it (runs of zero
+        pages in disk images and sparse files) reuses its digest
+        """
+        crcs, digests = [], []
+        self.leaves_hashed = 0
+        with open(self.path, 'rb') as f:
+            length = os.fstat(f.fileno()).st_size
+            self._layout(length)
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if length else None
+            previous = None
+            try:
+                with memoryview(mapped if mapped is not None else b'') as view:
+                    for i, (crc, leaf) in enumerate(self._leaves(view)):
+                        digest = reuse(i, crc) if reuse is not None else None
+                        if digest is None:
+                            if previous is not None and crc == crcs[-1] and leaf == previous:
+                                digest = digests[-1]
+                            else:
+                                digest = leaf_digest(leaf)
+                                self.leaves_hashed += 1
+                        crcs.append(crc)
+                        digests.append(digest)
+                        previous = leaf
+                    # the views of the map must be released before it is closed
+                    previous = leaf = None
+            finally:
+                if mapped is not None:
+                    mapped.close()
+        return crcs, digests
+
+    def _write(self, crcs, digests):
+        """Write a complete index from leaf CRC-32s and digests, building the interior levels"""
+        self.close()
+        levels = [digests]
+        self.nodes_hashed = 0
+        while len(levels[-1]) > 1:
+            level = levels[-1]
+            parents = []
+            previous = None
+            for i in range(0, len(level), self.fanout):
+                children = b''.join(level[i:i + self.fanout])
+                # runs of identical leaves make runs of identical parents, hash each run once
+                if children != previous:
+                    digest = SHA256Hash(INTERIOR_PREFIX + children).digest()
+                    self.nodes_hashed += 1
+                    previous = children
+                parents.append(digest)
+            levels.append(parents)
+        temporary = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.leaf_size, self.fanout, self.length))
+            f.write(struct.pack(f'>{len(crcs)}I', *crcs))
+            for level in levels:
+                f.write(b''.join(level))
+        os.replace(temporary, self.index_path)
+        if not self._open():
+            raise RuntimeError(f'{self.index_path}: index written but could not be opened')
+
+    def build(self):
+        """Hash every leaf of the file and write the index"""
+        self._write(*self._scan())
+
+    def update(self, changes=None):
+        """
+        Bring the index up to date with the file and return the number of leaves re-hashed.  changes is an iterable of
+        (offset, length) byte ranges modified since the last update; without it every leaf's CRC-32 is checked.  If the
+        file changed length the whole file is scanned, reusing the digests of leaves whose CRC-32 did not change
+        """
+        length = os.stat(self.path).st_size
+        if length != self.length:
+            # leaves that were complete before may be reused, the old partial last leaf is always re-hashed.  The old
+            # leaf digests are read at their old offset, _scan lays the index out for the new length
+            full = self.length // self.leaf_size
+            leaves = self.offsets[0]
+            index = self._index
+
+            def reuse(i, crc):
+                if i < full and crc == self.crc(i):
+                    return index[leaves + DIGEST_SIZE * i:leaves + DIGEST_SIZE * (i + 1)]
+                return None
+            self._write(*self._scan(reuse))
+            return self.leaves_hashed
+        if changes is None:
+            changed = self._changed_leaves()
+        else:
+            changed = set()
+            for offset, size in changes:
+                first = max(offset, 0) // self.leaf_size
+                last = min((offset + max(size, 1) - 1) // self.leaf_size, self.count - 1)
+                changed.update(range(first, last + 1))
+        self._rehash(sorted(changed))
+        return self.leaves_hashed
+
+    def _changed_leaves(self):
+        """Indexes of the leaves whose CRC-32 differs from the index"""
+        if not self.length:
+            return []
+        changed = []
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for i, (crc, leaf) in enumerate(self._leaves(view)):
+                        if crc != self.crc(i):
+                            changed.append(i)
+                    leaf = None
+        return changed
+
+    def _rehash(self, leaves):
+        """Re-hash the given leaves and the interior nodes above them, writing them into the index"""
+        self.leaves_hashed = self.nodes_hashed = 0
+        if not leaves:
+            return
+        with open(self.path, 'rb') as f:
+            for i in leaves:
+                leaf = os.pread(f.fileno(), self.leaf_size, i * self.leaf_size)
+                struct.pack_into('>I', self._index, HEADER.size + 4 * i, zlib.crc32(leaf))
+                offset = self.offsets[0] + DIGEST_SIZE * i
+                self._index[offset:offset + DIGEST_SIZE] = leaf_digest(leaf)
+                self.leaves_hashed += 1
+        dirty = leaves
+        for level in range(1, len(self.sizes)):
+            dirty = sorted({i // self.fanout for i in dirty})
+            for i in dirty:
+                start = self.offsets[level - 1] + DIGEST_SIZE * i * self.fanout
+                end = self.offsets[level - 1] + DIGEST_SIZE * min((i + 1) * self.fanout, self.sizes[level - 1])
+                offset = self.offsets[level] + DIGEST_SIZE * i
+                self._index[offset:offset + DIGEST_SIZE] = SHA256Hash(INTERIOR_PREFIX + self._index[start:end]).digest()
+                self.nodes_hashed += 1
+
+
+def parse_range(text):
+    """Parse a changed byte range OFFSET:LENGTH"""
+    offset, _, length = text.partition(':')
+    return int(offset), int(length or 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sha256merkle', description='Update the Merkle index of a file and print '
+                                                                      'its tree hash')
+    parser.add_argument('file', metavar='FILE')
+    parser.add_argument('--index', default=None, help='index file (default: FILE.merkle)')
+    parser.add_argument('--leaf-size', type=int, default=LEAF_SIZE, help=f'leaf size in bytes (default: {LEAF_SIZE})')
+    parser.add_argument('--fanout', type=int, default=FANOUT, help=f'children per interior node (default: {FANOUT})')
+    parser.add_argument('--changed', action='append', type=parse_range, default=None, metavar='OFFSET:LENGTH',
+                        help='byte range changed since the last run, may be repeated (default: compare CRC-32s of '
+                             'every leaf)')
+    args = parser.parse_args(argv)
+    with MerkleIndex(args.file, args.index, args.leaf_size, args.fanout) as index:
+        if not index.created:
+            index.update(args.changed)
+        print(f"{index.hexdigest()}  {args.file}")
+        print(f"sha256merkle: {index.leaves_hashed} leaves and {index.nodes_hashed} nodes re-hashed", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
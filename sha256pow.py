@@ -0,0 +1,145 @@
+'''
+Double SHA-256 nonce search (proof of work) over an 80 byte header, built on sha256.compress.
+
+The header is two blocks.  The first 64 bytes never change, so they are compressed once into a midstate.  Each
+attempt only patches the nonce word (bytes 76-79, little-endian as in Bitcoin headers) into the 16 precomputed words
+of the second block, and the second hash of the 32 byte digest reuses a fixed padding tail, so an attempt is exactly
+three calls to compress.  A header is a solution when its double SHA-256 digest, read as a little-endian 256-bit
+number (Bitcoin convention), is at most target.
+
+Nonce ranges are split into chunks that run in worker processes; once a solution is found the remaining chunks are
+cancelled and running chunks stop early.
+'''
+
+
+import multiprocessing
+import os
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from sha256 import HASH_VALUES, SHA256Hash, compress, padding
+
+HEADER_SIZE = 80
+NONCE_RANGE = 1 << 32
+# nonces per worker task, and how often (in nonces) a running task checks whether another worker has found a solution
+CHUNK_SIZE = 1 << 16
+CANCEL_CHECK = 1 << 10
+# padding words of the second hash: a 32 byte message, the 1 bit, zeros and the length 256 bits
+DIGEST_TAIL = [0x80000000, 0, 0, 0, 0, 0, 0, 256]
+
+
+def double_sha256(data):
+    """SHA-256 of the SHA-256 digest of data"""
+    return SHA256Hash(SHA256Hash(data).digest()).digest()
+
+
+def with_nonce(header, nonce):
+    """Return the header with its nonce field set"""
+    return bytes(header[:76]) + struct.pack('<I', nonce)
+
+
+def digest_value(digest):
+    """The digest as the little-endian 256-bit number compared with the target"""
+    return int.from_bytes(digest, 'little')
+
+
+class SearchResult:
+    """Outcome of a nonce search: the nonce and digest found (None if no nonce in the range met the target), the
+    number of hashes computed and the elapsed time"""
+
+    def __init__(self, nonce, digest, hashes, seconds):
+        self.nonce = nonce
+        self.digest = digest
+        self.hashes = hashes
+        self.seconds = seconds
+
+    @property
+    def hashes_per_second(self):
+        return self.hashes / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return (f"SearchResult(nonce={self.nonce}, digest={self.digest.hex() if self.digest else None}, "
+                f"hashes={self.hashes}, hashes_per_second={self.hashes_per_second:.0f})")
+
+
+def search_range(header, target, start, end, cancel=None):
+    """
+    Try nonces start...end-1 in this process and return (nonce, digest, hashes computed).  nonce and digest are
+    None if no nonce met the target, or if cancel (a multiprocessing.Event) was set by another worker.
+    """
+    if len(header) != HEADER_SIZE:
+        raise ValueError(f'header must be {HEADER_SIZE} bytes')
+    midstate = compress(HASH_VALUES, struct.unpack_from('>16I', header))
+    # words of the second block: 3 fixed header words, the nonce word, and the padding of an 80 byte message
+    block = list(struct.unpack('>16I', bytes(header[64:80]) + padding(HEADER_SIZE)))
+    # the digest is compared as a little-endian number, so its most significant 32 bits are the byte-swapped last
+    # word: only candidates whose last word passes this cheap check are converted to bytes
+    limit = target >> 224
+    for batch_start in range(start, end, CANCEL_CHECK):
+        if cancel is not None and cancel.is_set():
+            return None, None, batch_start - start
+        for nonce in range(batch_start, min(batch_start + CANCEL_CHECK, end)):
+            # the nonce is stored little-endian, so the big-endian block word is its byte swap
+            block[3] = int.from_bytes(nonce.to_bytes(4, 'little'), 'big')
+            h = compress(HASH_VALUES, compress(midstate, block) + DIGEST_TAIL)
+            if int.from_bytes(h[7].to_bytes(4, 'little'), 'big') <= limit:
+                digest = struct.pack('>8I', *h)
+                if digest_value(digest) <= target:
+                    return nonce, digest, nonce - start + 1
+    return None, None, end - start
+
+
+_cancel = None
+
+
+def _init_worker(cancel):
+    global _cancel
+    _cancel = cancel
+
+
+def _search_chunk(header, target, start, end):
+    return search_range(header, target, start, end, _cancel)
+
+
+def search(header, target, start=0, end=NONCE_RANGE, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Search nonces start...end-1 for a header whose double SHA-256 is at most target and return a SearchResult.
+    Chunks of chunk_size nonces run in a pool of workers processes (default: one per CPU, with workers=1 the search
+    runs in this process).  With several workers the nonce returned is the first one found, not necessarily the
+    smallest solution in the range.
+    """
+    began = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        nonce, digest, hashes = search_range(header, target, start, end)
+        return SearchResult(nonce, digest, hashes, time.perf_counter() - began)
+    cancel = multiprocessing.Event()
+    chunks = iter(range(start, end, chunk_size))
+    found = (None, None)
+    hashes = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cancel,)) as executor:
+        # keep two chunks per worker in flight rather than submitting the whole range
+        pending = set()
+        while True:
+            while found[0] is None and len(pending) < 2 * workers:
+                chunk_start = next(chunks, None)
+                if chunk_start is None:
+                    break
+                pending.add(executor.submit(_search_chunk, header, target, chunk_start,
+                                            min(chunk_start + chunk_size, end)))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                # chunks cancelled after a solution was found never ran
+                if future.cancelled():
+                    continue
+                nonce, digest, count = future.result()
+                hashes += count
+                if nonce is not None and found[0] is None:
+                    found = (nonce, digest)
+                    cancel.set()
+                    for other in pending:
+                        other.cancel()
+    return SearchResult(found[0], found[1], hashes, time.perf_counter() - began)
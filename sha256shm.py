@@ -0,0 +1,113 @@
+'''
+Persistent process pool hashing large in-memory buffers with SHA256Hash, passing them through shared memory.
+
+Sending a multi-MB buffer to a ProcessPoolExecutor worker pickles it, pipes it and unpickles it, which costs about as
+much as the parallel hashing saves.  SharedMemoryPool instead places the buffers in one multiprocessing.shared_memory
+segment and sends each worker only the segment name, an offset and a length: the worker attaches the segment, hashes
+a memoryview of its slice and returns the 32 byte digest.
+
+Segments are created and unlinked by the parent only.  hash_buffers copies the buffers into a segment (one memcpy, no
+pickling); callers producing data can write straight into a segment from segment() and hash it with hash_segment.
+Every segment is unlinked when its call returns or fails, and close() (or leaving the with block) unlinks any still
+open; a parent killed outright leaves them to the multiprocessing resource tracker, which unlinks them at exit.
+
+    with SharedMemoryPool(workers=4) as pool:
+        digests = pool.hash_buffers(buffers)
+'''
+
+
+import contextlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from sha256 import SHA256Hash
+
+
+def _hash_slice(name, offset, length):
+    """Worker task: return the digest of length bytes at offset in the shared memory segment name"""
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        # the view must be released before the segment can be closed
+        with segment.buf[offset:offset + length] as view:
+            return SHA256Hash(view).digest()
+    finally:
+        segment.close()
+
+
+class SharedMemoryPool:
+    """Process pool of workers (default: the number of CPUs) hashing buffers placed in shared memory"""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(self.workers)
+        # name -> SharedMemory of the segments created and not yet unlinked
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def create_segment(self, size):
+        """Create a shared memory segment of at least size bytes, owned by the pool until release_segment"""
+        segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        with self._lock:
+            self._segments[segment.name] = segment
+        return segment
+
+    def release_segment(self, segment):
+        """Close and unlink a segment from create_segment"""
+        with self._lock:
+            self._segments.pop(segment.name, None)
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+    @contextlib.contextmanager
+    def segment(self, size):
+        """Context manager: a segment of size bytes to fill (through segment.buf) and pass to hash_segment, unlinked
+        on exit"""
+        segment = self.create_segment(size)
+        try:
+            yield segment
+        finally:
+            self.release_segment(segment)
+
+    def hash_segment(self, segment, ranges):
+        """Return the digests of the (offset, length) ranges of a segment, in order, hashed in parallel"""
+        futures = [self._executor.submit(_hash_slice, segment.name, offset, length) for offset, length in ranges]
+        try:
+            return [future.result() for future in futures]
+        finally:
+            # after a failure, don't start hashing slices of a segment that is about to be unlinked
+            for future in futures:
+                future.cancel()
+
+    def hash_buffers(self, buffers):
+        """Return the digests of the bytes-like buffers, in order: the buffers are copied back to back into one
+        segment and hashed by the workers in parallel"""
+        views = [memoryview(buffer).cast('B') for buffer in buffers]
+        ranges = []
+        offset = 0
+        for view in views:
+            ranges.append((offset, len(view)))
+            offset += len(view)
+        with self.segment(offset) as segment:
+            for (start, length), view in zip(ranges, views):
+                segment.buf[start:start + length] = view
+            return self.hash_segment(segment, ranges)
+
+    def close(self):
+        """Shut down the workers and unlink any segment still open"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            segments = list(self._segments.values())
+        for segment in segments:
+            self.release_segment(segment)
+
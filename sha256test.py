@@ -12,11 +12,47 @@ tests for hashlib SHA-256 vs SHA-512 for varying length strings.
 
 
 import unittest
+import unittest.mock
 from sha256 import *
+import sha256
+import array
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import sha256manifest
+import sha256treehash
+import sha256hmac
+import sha256pow
+import sha256index
+import sha256async
+import sha256bench
+import sha256unrolled
+import sha256family
+import sha256backend
+import sha256cavp
+import sha256dedup
+import sha256shm
+import sha256merkle
+from multiprocessing import shared_memory
+import asyncio
+import hmac
+import struct
+import zlib
+try:
+    import sha256batch
+except ImportError:
+    # the batch engine needs numpy
+    sha256batch = None
 import hashlib
 import random
 import itertools
 import timeit
+import tracemalloc
 from string import ascii_uppercase, digits, ascii_lowercase
 
 
@@ -46,6 +82,21 @@ class PreProcessDataTestCase(unittest.TestCase):
         print('Pre-Processed Data:')
         print(self.str_test_case.preprocessed, "\n")
 
+    def testBytesInput(self):
+        """bytes-like inputs give the same binary string and blocks as the equivalent string"""
+        for data in (b"hello world", bytearray(b"hello world"), memoryview(b"hello world"),
+                     array.array('B', b"hello world")):
+            test = PreProcessData(data)
+            self.assertEqual(test.convert_to_binary(), self.str_test_case.convert_to_binary())
+            self.assertEqual(test.parse(), self.str_test_case.parse())
+
+    def testMessageBlocks(self):
+        """message_blocks reads the same words as parse, for single and multiple blocks"""
+        for length in (0, 55, 56, 63, 64, 65, 119, 120, 200):
+            test = PreProcessData(bytes(random.randrange(256) for _ in range(length)))
+            expected = [tuple(int(word, 2) for word in block[:16]) for block in test.parse()]
+            self.assertEqual(list(test.message_blocks()), expected)
+
     def testHashValues(self):
         """Make sure correct hash values were generated - compare to original values provided by NIST"""
         test = self.str_test_case.hash_values()
@@ -104,6 +155,15 @@ class FunctionsTestCase(unittest.TestCase):
         self.assertEqual(shift_right('00101010100010101010', 3), '00000101010100010101')
 
 
+    def testIntegerRoot(self):
+        """Make sure integer roots are exact, including numbers too large for floats"""
+        for k in (2, 3):
+            for n in itertools.chain(range(200), [2 ** 200, 3 ** 300 - 1, 311 << 96]):
+                root = integer_root(n, k)
+                self.assertLessEqual(root ** k, n)
+                self.assertGreater((root + 1) ** k, n)
+
+
 class SHA256TestCase(unittest.TestCase):
     """Test that class SHA256 outputs the correct digest"""
 
@@ -145,6 +205,1052 @@ class SHA256TestCase(unittest.TestCase):
         print("Tests passed for 1000 random words")
 
 
+    def testBlockDecompositionRepeated(self):
+        """the message schedule is rebuilt, not appended to, on every call"""
+        test = SHA256("a" * 100)
+        self.assertEqual(len(test.block_decomposition()), 2)
+        self.assertEqual(len(test.block_decomposition()), 2)
+
+    def testExpand(self):
+        """the rolling 16-word schedule matches the full 64-word schedule of block_decomposition"""
+        test = SHA256("a" * 100)
+        for block, schedule in zip(test.preprocessed.binary_blocks(), test.block_decomposition()):
+            self.assertEqual(list(test.expand(block)), schedule)
+
+    def testConstantMemory(self):
+        """peak memory while hashing does not grow with the number of blocks"""
+        peaks = []
+        for blocks in (2, 32):
+            data = bytes(64 * blocks)
+            test = SHA256(data)
+            tracemalloc.start()
+            try:
+                digest = test.hexdigest()
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+        # the 30 extra blocks would need over 120 KB for their schedules alone
+        self.assertLess(peaks[1], peaks[0] + 8192)
+
+    def testHexdigestDoesNotPrint(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            digest = SHA256("hello world").hexdigest()
+        self.assertEqual(output.getvalue(), "")
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(SHA256("hello world").generate_hash(), digest)
+        self.assertEqual(output.getvalue(), digest + "\n")
+
+    def testDigestMultipleBlocks(self):
+        # messages longer than one 512-bit block, including the lengths where padding spills into a new block
+        for length in (55, 56, 64, 100):
+            test_str = ''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in range(length))
+            self.assertEqual(SHA256(test_str).generate_hash(), hashlib.sha256(test_str.encode("ascii")).hexdigest())
+
+    def testDigestBytesAndUnicode(self):
+        # binary payloads and strings with code points above 255 (hashed as UTF-8)
+        self.assertEqual(SHA256(bytes(range(256))).generate_hash(), hashlib.sha256(bytes(range(256))).hexdigest())
+        self.assertEqual(SHA256("h\u00e9llo w\u00f6rld \u2603").generate_hash(),
+                         hashlib.sha256("h\u00e9llo w\u00f6rld \u2603".encode("utf-8")).hexdigest())
+
+
+class SHA256IntTestCase(unittest.TestCase):
+    """Test that the integer engine SHA256Int outputs the same digest as SHA256 and hashlib"""
+
+    def testCompressHelloWorld(self):
+        """compress a single block and compare with the final hash values from the sample data"""
+        words = [int(word, 2) for word in PreProcessData("hello world").parse()[0][:16]]
+        self.assertEqual(''.join(format(x, '08x') for x in compress(HASH_VALUES, words)),
+                         hashlib.sha256("hello world".encode("ascii")).hexdigest())
+
+    def testDigestBytes(self):
+        # every length up to 4 blocks, as bytes, bytearray and memoryview input
+        for length in range(0, 256):
+            data = bytes(random.randrange(256) for _ in range(length))
+            expected = hashlib.sha256(data).hexdigest()
+            for test_input in (data, bytearray(data), memoryview(data)):
+                self.assertEqual(SHA256Int(test_input).generate_hash(), expected)
+
+    def testDigestRandomLib(self):
+        # same 1000 random strings as SHA256TestCase, checked against both SHA256 and hashlib
+        for i in range(1000):
+            test_str = ''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in
+                               range(random.randint(0, 20)))
+            expected = hashlib.sha256(test_str.encode("ascii")).hexdigest()
+            self.assertEqual(SHA256Int(test_str).generate_hash(), expected)
+            if i % 100 == 0:
+                self.assertEqual(SHA256(test_str).generate_hash(), expected)
+
+
+class ShortMessageTestCase(unittest.TestCase):
+    """Test the single-block fast path and hash_many"""
+
+    def testHashBlock(self):
+        for length in range(56):
+            data = bytes(random.randrange(256) for _ in range(length))
+            self.assertEqual(hash_block(data), hashlib.sha256(data).digest())
+        with self.assertRaises(ValueError):
+            hash_block(bytes(56))
+
+    def testHashMany(self):
+        # short and long messages mixed, and the buffers reused after a longer message
+        messages = [bytes(random.randrange(256) for _ in range(length)) for length in (30, 55, 56, 0, 200, 10, 64)]
+        messages += [bytearray(b"abc"), memoryview(b"abcd")]
+        self.assertEqual(hash_many(messages), [hashlib.sha256(data).digest() for data in messages])
+        self.assertEqual(hash_many(iter([])), [])
+
+    def testWideItems(self):
+        # lengths are in bytes, not items: an array of 2 or 4 byte items is hashed as its bytes
+        for data in (array.array("H", range(20)), array.array("I", range(13)), array.array("I", range(100))):
+            expected = hashlib.sha256(data.tobytes()).digest()
+            if data.itemsize * len(data) <= SHORT_MESSAGE:
+                self.assertEqual(hash_block(data), expected)
+            self.assertEqual(hash_many([data]), [expected])
+        with self.assertRaises(ValueError):
+            hash_block(array.array("H", range(28)))
+        self.assertEqual(hash_block(b"abc"), hashlib.sha256(b"abc").digest())
+
+    def testHashBlockThreads(self):
+        messages = [bytes(random.randrange(256) for _ in range(random.randrange(56))) for _ in range(400)]
+        expected = [hashlib.sha256(data).digest() for data in messages]
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            for _ in range(5):
+                self.assertEqual(list(executor.map(hash_block, messages)), expected)
+
+    def testCompressBuffer(self):
+        words = [random.getrandbits(32) for _ in range(16)]
+        self.assertEqual(list(compress_buffer(HASH_VALUES, words + [0] * 48)), compress(HASH_VALUES, words))
+
+
+class UnrolledTestCase(unittest.TestCase):
+    """Test the generated, fully unrolled compression function"""
+
+    def testCompress(self):
+        for _ in range(50):
+            state = [random.getrandbits(32) for _ in range(8)]
+            words = [random.getrandbits(32) for _ in range(16)]
+            self.assertEqual(sha256unrolled.compress(state, words), compress(state, words))
+
+    def testDigest(self):
+        for length in (0, 20, 55, 56, 64, 200):
+            data = bytes(random.randrange(256) for _ in range(length))
+            self.assertEqual(sha256unrolled.SHA256Unrolled(data).generate_hash(), hashlib.sha256(data).hexdigest())
+
+    def testDiskCache(self):
+        """the first build writes the code object, the second loads it instead of generating the source"""
+        with tempfile.TemporaryDirectory() as directory:
+            first = sha256unrolled.build(cache_dir=directory)
+            path = sha256unrolled.cache_path(directory)
+            self.assertTrue(os.path.exists(path))
+            modified = os.stat(path).st_mtime_ns
+            second = sha256unrolled.build(cache_dir=directory)
+            self.assertEqual(os.stat(path).st_mtime_ns, modified)
+            words = list(range(16))
+            self.assertEqual(first(HASH_VALUES, words), second(HASH_VALUES, words))
+            # a corrupt cache file is regenerated
+            with open(path, "wb") as f:
+                f.write(b"not marshal data")
+            self.assertEqual(sha256unrolled.build(cache_dir=directory)(HASH_VALUES, words), compress(HASH_VALUES, words))
+
+
+class FamilyTestCase(unittest.TestCase):
+    """Test the SHA-2 family engine against hashlib"""
+
+    def testDigests(self):
+        # lengths around the padding boundaries of both block sizes
+        for name in sha256family.VARIANTS:
+            for length in (0, 3, 55, 56, 64, 111, 112, 128, 300):
+                data = bytes(random.randrange(256) for _ in range(length))
+                test = sha256family.new(name, data)
+                self.assertEqual(test.hexdigest(), hashlib.new(name, data).hexdigest(), (name, length))
+                self.assertEqual(test.digest_size, hashlib.new(name).digest_size)
+                self.assertEqual(test.block_size, hashlib.new(name).block_size)
+
+    def testConstants(self):
+        """the SHA-256 variant derives the same constants as sha256"""
+        self.assertEqual(sha256family.SHA256.iv, HASH_VALUES)
+        self.assertEqual(sha256family.SHA256.k, ROUND_CONSTANTS)
+        self.assertEqual(sha256family.SHA512.iv[0], 0x6a09e667f3bcc908)
+        self.assertEqual(sha256family.SHA512_256.iv[0], 0x22312194fc2bf72c)
+
+    def testIncremental(self):
+        data = bytes(range(256)) * 3
+        for name in ("sha224", "sha512_256"):
+            test = sha256family.new(name)
+            for i in range(0, len(data), 37):
+                test.update(data[i:i + 37])
+            copied = test.copy()
+            copied.update(b"more")
+            self.assertEqual(test.hexdigest(), hashlib.new(name, data).hexdigest())
+            self.assertEqual(copied.hexdigest(), hashlib.new(name, data + b"more").hexdigest())
+
+    def testNames(self):
+        self.assertEqual(sha256family.new("SHA-512/256").name, "sha512_256")
+        with self.assertRaises(ValueError):
+            sha256family.new("md5")
+        with self.assertRaises(TypeError):
+            sha256family.sha384("text")
+
+
+class BackendTestCase(unittest.TestCase):
+    """Test the backend probing and dispatch"""
+
+    def tearDown(self):
+        # re-probe with the real environment
+        sha256backend.probe()
+
+    def testBackendsAgree(self):
+        messages = [bytes(random.randrange(256) for _ in range(length)) for length in (0, 20, 64, 100)]
+        expected = [hashlib.sha256(data).digest() for data in messages]
+        for backend in sha256backend.backends.values():
+            if backend.available:
+                self.assertEqual(backend.digest_many(messages), expected, backend.name)
+                self.assertEqual(backend.digest(messages[1]), expected[1], backend.name)
+
+    def testSelection(self):
+        with unittest.mock.patch.dict(os.environ, {"SHA256_NATIVE": "0"}):
+            sha256backend.probe()
+        self.assertFalse(sha256backend.backends["hashlib"].available)
+        self.assertEqual(sha256backend.select(100).name, "unrolled")
+        if sha256backend.backends["numpy"].available:
+            self.assertEqual(sha256backend.select(100, sha256backend.BATCH_MIN).name, "numpy")
+        # messages too large for the numpy lanes
+        self.assertEqual(sha256backend.select(sha256backend.BATCH_MAX_SIZE + 1, 100).name, "unrolled")
+        self.assertEqual(sha256backend.digest_many([b"abc"] * 40), [hashlib.sha256(b"abc").digest()] * 40)
+
+    def testOverride(self):
+        with unittest.mock.patch.dict(os.environ, {"SHA256_BACKEND": "int"}):
+            sha256backend.probe()
+        before = sha256backend.status()["int"]["messages"]
+        self.assertEqual(sha256backend.hexdigest(b"abc"), hashlib.sha256(b"abc").hexdigest())
+        self.assertEqual(sha256backend.select(0, 1000).name, "int")
+        self.assertTrue(sha256backend.status()["int"]["forced"])
+        self.assertEqual(sha256backend.status()["int"]["messages"], before + 1)
+        with unittest.mock.patch.dict(os.environ, {"SHA256_BACKEND": "md5"}):
+            with self.assertRaises(ValueError):
+                sha256backend.probe()
+
+    def testReferenceThreads(self):
+        """the reference backend neither prints nor touches sys.stdout, so it can serve several threads"""
+        with unittest.mock.patch.dict(os.environ, {"SHA256_BACKEND": "reference", "SHA256_NATIVE": "0"}):
+            sha256backend.probe()
+        messages = [bytes([i]) * 20 for i in range(8)]
+        stdout = sys.stdout
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                digests = list(executor.map(sha256backend.digest, messages))
+        self.assertIs(sys.stdout, stdout)
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(digests, [hashlib.sha256(data).digest() for data in messages])
+
+    def testSelfTest(self):
+        """a backend that gets the vectors wrong is not enabled, and cannot be forced"""
+        broken = lambda: ((lambda data: hashlib.sha256(data + b"!").digest()), None)
+        with unittest.mock.patch.dict(sha256backend.LOADERS, {"hashlib": broken}):
+            sha256backend.probe()
+            self.assertFalse(sha256backend.backends["hashlib"].available)
+            self.assertIn("self-test failed", sha256backend.status()["hashlib"]["error"])
+            self.assertEqual(sha256backend.select(0).name, "unrolled")
+            with unittest.mock.patch.dict(os.environ, {"SHA256_BACKEND": "hashlib"}):
+                with self.assertRaises(RuntimeError):
+                    sha256backend.probe()
+
+
+class CAVPTestCase(unittest.TestCase):
+    """Run the vendored CAVP vectors against every engine (the slow ones against part of them)"""
+
+    # engines too slow for the LongMsg file and the Monte Carlo test in the test suite
+    SLOW = {"SHA256": 16, "sha256batch": 4}
+
+    def testMessages(self):
+        for engine in sha256cavp.available_engines():
+            for name in sha256cavp.MESSAGE_FILES:
+                limit = self.SLOW.get(engine)
+                result = sha256cavp.check_messages(engine, os.path.join(sha256cavp.VECTOR_DIR, name), limit)
+                self.assertTrue(result.ok, result.line())
+                self.assertEqual(result.passed, limit or 64 + (name == "SHA256ShortMsg.rsp"))
+
+    def testMonteCarlo(self):
+        for engine in sha256cavp.available_engines():
+            if engine not in self.SLOW:
+                result = sha256cavp.check_monte(engine, os.path.join(sha256cavp.VECTOR_DIR, sha256cavp.MONTE_FILE), 1)
+                self.assertTrue(result.ok, result.line())
+                self.assertEqual(result.hashes, 1000)
+
+    def testNISTVectors(self):
+        """the vendored files are NIST's: the published Monte Carlo seed and first checkpoint, and the ShortMsg count"""
+        seed, checkpoints = sha256cavp.read_monte(os.path.join(sha256cavp.VECTOR_DIR, sha256cavp.MONTE_FILE))
+        self.assertEqual(seed.hex(), "6d1e72ad03ddeb5de891e572e2396f8da015d899ef0e79503152d6010a3fe691")
+        self.assertEqual(checkpoints[0].hex(), "e93c330ae5447738c8aa85d71a6c80f2a58381d05872d26bdd39f1fcd4f2b788")
+        self.assertEqual(len(checkpoints), 100)
+        self.assertEqual(len(sha256cavp.read_messages(os.path.join(sha256cavp.VECTOR_DIR, "SHA256ShortMsg.rsp"))), 65)
+
+    def testFailure(self):
+        """a wrong digest is reported with its index"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "SHA256ShortMsg.rsp")
+            with open(path, "w") as f:
+                f.write("[L = 32]\n\nLen = 0\nMsg = 00\nMD = " + hashlib.sha256(b"").hexdigest() +
+                        "\n\nLen = 8\nMsg = 61\nMD = " + hashlib.sha256(b"b").hexdigest() + "\n")
+            result = sha256cavp.check_messages("SHA256Hash", path)
+            self.assertFalse(result.ok)
+            self.assertEqual((result.passed, result.failed), (1, [1]))
+            self.assertIn("FAIL", result.line())
+
+
+class DedupTestCase(unittest.TestCase):
+    """Test content-defined chunking and the chunk store"""
+
+    SIZES = dict(min_size=256, avg_size=1024, max_size=8192)
+
+    def setUp(self):
+        self.data = random.Random(1).randbytes(200000)
+
+    def testChunkSizes(self):
+        chunks = sha256dedup.chunk_bytes(self.data, **self.SIZES)
+        self.assertEqual(b"".join(chunks), self.data)
+        for chunk in chunks[:-1]:
+            self.assertTrue(256 <= len(chunk) <= 8192)
+        self.assertTrue(512 < len(self.data) / len(chunks) < 4096)
+        with self.assertRaises(ValueError):
+            list(sha256dedup.chunk_stream(io.BytesIO(self.data), min_size=4096, avg_size=1024, max_size=8192))
+
+    def testStream(self):
+        """chunking a stream gives the same chunks whatever the read size"""
+        chunks = sha256dedup.chunk_bytes(self.data, **self.SIZES)
+        for read_size in (1, 1000, 8192, 1 << 20):
+            self.assertEqual(list(sha256dedup.chunk_stream(io.BytesIO(self.data), read_size=read_size, **self.SIZES)),
+                             chunks)
+        self.assertEqual(list(sha256dedup.chunk_stream(io.BytesIO(b""))), [])
+
+    def testEditLocality(self):
+        """an insertion only changes the chunks around it"""
+        edited = self.data[:100000] + b"inserted" + self.data[100000:]
+        before = set(sha256dedup.chunk_bytes(self.data, **self.SIZES))
+        changed = [chunk for chunk in sha256dedup.chunk_bytes(edited, **self.SIZES) if chunk not in before]
+        self.assertLess(sum(map(len, changed)), 3 * 8192)
+
+    def testStore(self):
+        edited = self.data[:50000] + b"x" * 100 + self.data[50100:]
+        with tempfile.TemporaryDirectory() as directory:
+            store = sha256dedup.ChunkStore(directory, **self.SIZES)
+            recipe = store.store(io.BytesIO(self.data))
+            self.assertEqual(store.stats.new_bytes, len(self.data))
+            digest, length = recipe[0]
+            self.assertEqual(store.path(digest), os.path.join(directory, digest[:2], digest[2:4], digest))
+            self.assertEqual(sum(length for _, length in recipe), len(self.data))
+            # storing the file again writes nothing, the edited file only the chunks around the edit
+            store.store(io.BytesIO(self.data))
+            self.assertEqual(store.stats.new_bytes, len(self.data))
+            edited_recipe = store.store(io.BytesIO(edited))
+            self.assertLess(store.stats.new_bytes - len(self.data), 3 * 8192)
+            self.assertGreater(store.stats.dedup_ratio, 2.5)
+            output = io.BytesIO()
+            store.restore(edited_recipe, output)
+            self.assertEqual(output.getvalue(), edited)
+            # recipes round trip through their text form
+            self.assertEqual(sha256dedup.read_recipe(io.StringIO(sha256dedup.format_recipe(recipe))), recipe)
+            with open(store.path(digest), "wb") as f:
+                f.write(b"corrupt")
+            with self.assertRaises(ValueError):
+                store.get(digest)
+            with self.assertRaises(KeyError):
+                store.get("0" * 64)
+
+
+class SHA256HashTestCase(unittest.TestCase):
+    """Test that the incremental hasher SHA256Hash behaves like hashlib.sha256"""
+
+    def testUpdateInPieces(self):
+        # feed random bytes of every length up to 4 blocks in random sized pieces
+        for length in range(0, 256):
+            data = bytes(random.randrange(256) for _ in range(length))
+            test = SHA256Hash()
+            start = 0
+            while start < length:
+                end = random.randint(start, length)
+                test.update(data[start:end])
+                start = end
+            self.assertEqual(test.hexdigest(), hashlib.sha256(data).hexdigest())
+            self.assertEqual(test.digest(), hashlib.sha256(data).digest())
+
+    def testDigestKeepsState(self):
+        """digest() should not change the state, so hashing can continue afterwards"""
+        test = SHA256Hash(b"hello")
+        self.assertEqual(test.hexdigest(), hashlib.sha256(b"hello").hexdigest())
+        test.update(bytearray(b" world"))
+        self.assertEqual(test.hexdigest(), hashlib.sha256(b"hello world").hexdigest())
+        self.assertEqual(test.hexdigest(), SHA256("hello world").generate_hash())
+
+    def testCopy(self):
+        """a copy continues independently of the original"""
+        test = SHA256Hash(b"a" * 100)
+        fork = test.copy()
+        fork.update(b"b")
+        test.update(b"c")
+        self.assertEqual(fork.hexdigest(), hashlib.sha256(b"a" * 100 + b"b").hexdigest())
+        self.assertEqual(test.hexdigest(), hashlib.sha256(b"a" * 100 + b"c").hexdigest())
+
+    def testAttributes(self):
+        test = SHA256Hash()
+        reference = hashlib.sha256()
+        self.assertEqual((test.name, test.digest_size, test.block_size),
+                         (reference.name, reference.digest_size, reference.block_size))
+        self.assertRaises(TypeError, test.update, "hello world")
+
+
+class CheckpointTestCase(unittest.TestCase):
+    """Test exporting and resuming the state of SHA256Hash"""
+
+    def testResume(self):
+        data = bytes(random.randrange(256) for _ in range(300))
+        for split in (0, 1, 63, 64, 65, 200, 300):
+            checkpoint = SHA256Hash(data[:split]).checkpoint()
+            self.assertLessEqual(len(checkpoint), 112)
+            resumed = SHA256Hash.resume(checkpoint)
+            self.assertEqual(resumed.length, split)
+            resumed.update(data[split:])
+            self.assertEqual(resumed.hexdigest(), hashlib.sha256(data).hexdigest())
+
+    def testInvalid(self):
+        checkpoint = SHA256Hash(b"abc").checkpoint()
+        corrupt = bytearray(checkpoint)
+        corrupt[10] ^= 1
+        newer = bytearray(checkpoint)
+        newer[4] = 2
+        newer[-4:] = struct.pack(">I", zlib.crc32(newer[:-4]))
+        for data, message in ((b"", "not a"), (b"abcd" * 30, "not a"), (corrupt, "corrupt"), (newer, "version"),
+                              (checkpoint[:-5] + checkpoint[-4:], "corrupt")):
+            with self.assertRaisesRegex(ValueError, message):
+                SHA256Hash.resume(data)
+
+    def testHashStream(self):
+        """an interrupted hash_stream resumes from its last checkpoint"""
+        data = bytes(random.randrange(256) for _ in range(5000))
+        checkpoints = []
+        hash_stream(io.BytesIO(data[:3500]), chunk_size=256, checkpoint=checkpoints.append, checkpoint_every=1000)
+        self.assertEqual(len(checkpoints), 3)
+        hasher = SHA256Hash.resume(checkpoints[-1])
+        f = io.BytesIO(data)
+        f.seek(hasher.length)
+        self.assertEqual(hash_stream(f, hasher=hasher).hexdigest(), hashlib.sha256(data).hexdigest())
+
+
+@unittest.skipIf(sha256batch is None, "numpy is not installed")
+class BatchTestCase(unittest.TestCase):
+    """Test that the numpy batch engine gives the same digests as the scalar engines"""
+
+    def testBatchDigest(self):
+        # mixed lengths give groups of 1 to 6 blocks, a small max_lanes splits the groups into several slices
+        messages = [bytes(random.randrange(256) for _ in range(random.randint(0, 300))) for _ in range(300)]
+        expected = [hashlib.sha256(message).digest() for message in messages]
+        self.assertEqual(sha256batch.batch_digest(messages), expected)
+        self.assertEqual(sha256batch.batch_digest(messages, max_lanes=7), expected)
+
+    def testBatchHexdigest(self):
+        # the 20 character strings of testDigestRandomLib
+        messages = [''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in
+                            range(random.randint(0, 20))) for _ in range(1000)]
+        self.assertEqual(sha256batch.batch_hexdigest(messages),
+                         [SHA256Int(message).generate_hash() for message in messages])
+        self.assertEqual(sha256batch.batch_hexdigest([]), [])
+
+
+class ProfilingTestCase(unittest.TestCase):
+    """Test the per-stage profiling hooks"""
+
+    def tearDown(self):
+        disable_profiling()
+
+    def testIntEngineStats(self):
+        events = []
+        with profiling(lambda *event: events.append(event)) as stats:
+            SHA256Int(bytes(1000)).generate_hash()
+        # 1000 bytes pad to 16 blocks
+        self.assertEqual((stats.blocks, stats.bytes), (16, 1000))
+        self.assertEqual(stats.primitive_calls["compress"], 16)
+        self.assertEqual(stats.stage_calls["compression"], 1)
+        self.assertEqual([(stage, blocks, nbytes) for stage, _, blocks, nbytes in events], [("compression", 16, 1000)])
+
+    def testStringEngineStages(self):
+        with profiling() as stats:
+            SHA256("hello world").hexdigest()
+        self.assertEqual(set(stats.stage_seconds), {"parse", "compression"})
+        self.assertEqual((stats.blocks, stats.bytes), (1, 11))
+        # 48 schedule words and 64 rounds
+        self.assertEqual(stats.primitive_calls["sigma_0"], 48)
+        self.assertEqual(stats.primitive_calls["maj"], 64)
+        self.assertIn("compression", stats.report())
+
+    def testHasherStats(self):
+        with profiling() as stats:
+            test = SHA256Hash(b"a" * 10)
+            test.update(b"b" * 100)
+            test.digest()
+        # the second update compresses one block, the digest pads the remaining 46 bytes into one block
+        self.assertEqual((stats.blocks, stats.bytes), (2, 110))
+        self.assertEqual(stats.stage_calls["update"], 2)
+
+    def testDisabled(self):
+        """disabling restores the plain primitives and records nothing"""
+        stats = enable_profiling()
+        disable_profiling()
+        self.assertIs(sha256.binary_add, binary_add)
+        self.assertIs(sha256.compress, compress)
+        self.assertIs(SHA256.__dict__["maj"].__func__, SHA256.maj)
+        SHA256Int("hello world").generate_hash()
+        self.assertEqual(stats.blocks, 0)
+
+
+class MidstateCacheTestCase(unittest.TestCase):
+    """Test hashing suffixes from cached prefix midstates"""
+
+    def testHashWithPrefix(self):
+        # prefixes shorter than, equal to and longer than a block, with and without a partial block left over
+        for prefix_length in (0, 10, 64, 100, 128):
+            prefix = bytes(random.randrange(256) for _ in range(prefix_length))
+            for suffix_length in (0, 5, 60, 200):
+                suffix = bytes(random.randrange(256) for _ in range(suffix_length))
+                self.assertEqual(hash_with_prefix(prefix, suffix).hexdigest(),
+                                 hashlib.sha256(prefix + suffix).hexdigest())
+
+    def testLRU(self):
+        cache = MidstateCache(maxsize=2)
+        cache.hash(b"header-a", b"1")
+        cache.hash(b"header-b", b"1")
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        # using a again makes b the least recently used, so c evicts b
+        self.assertEqual(cache.hash(bytearray(b"header-a"), b"2").digest(), hashlib.sha256(b"header-a2").digest())
+        cache.hash(b"header-c", b"1")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        cache.hash(b"header-a", b"3")
+        cache.hash(b"header-b", b"3")
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def testMidstateIsACopy(self):
+        """updating a returned midstate doesn't change the cached one"""
+        cache = MidstateCache()
+        cache.midstate(b"prefix").update(b"suffix")
+        self.assertEqual(cache.midstate(b"prefix").hexdigest(), hashlib.sha256(b"prefix").hexdigest())
+
+
+class DigestIndexTestCase(unittest.TestCase):
+    """Test the persistent digest index"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.directory.name, "index.sqlite")
+        self.paths = []
+        for i in range(3):
+            self.paths.append(os.path.join(self.directory.name, f"file{i}"))
+            with open(self.paths[-1], "wb") as f:
+                f.write(bytes([i]) * 1000)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testUnchangedFilesAreNotRead(self):
+        with sha256index.DigestIndex(self.index_path) as index:
+            for path in self.paths:
+                self.assertEqual(index.hexdigest(path), hash_file(path).hexdigest())
+            self.assertEqual((index.hits, index.misses), (0, 3))
+        # a new DigestIndex on the same file sees the stored digests
+        with sha256index.DigestIndex(self.index_path) as index:
+            for path in self.paths:
+                self.assertEqual(index.hexdigest(path), hash_file(path).hexdigest())
+            self.assertEqual((index.hits, index.misses), (3, 0))
+            # changing a file changes its size and mtime, so it is hashed again
+            with open(self.paths[0], "ab") as f:
+                f.write(b"!")
+            self.assertEqual(index.hexdigest(self.paths[0]), hash_file(self.paths[0]).hexdigest())
+            self.assertEqual((index.hits, index.misses), (3, 1))
+
+    def testEviction(self):
+        with sha256index.DigestIndex(self.index_path, max_entries=2) as index:
+            index.digest(self.paths[0])
+            index.digest(self.paths[1])
+            # using file0 again makes file1 the least recently used
+            index.digest(self.paths[0])
+            index.digest(self.paths[2])
+            self.assertEqual(len(index), 2)
+            self.assertIsNotNone(index.lookup(os.stat(self.paths[0])))
+            self.assertIsNone(index.lookup(os.stat(self.paths[1])))
+            self.assertIsNotNone(index.lookup(os.stat(self.paths[2])))
+
+    def testEvictionKeepsBound(self):
+        with sha256index.DigestIndex(self.index_path, max_entries=200) as index:
+            for i in range(500):
+                index.store(unittest.mock.Mock(st_dev=0, st_ino=i, st_size=100, st_mtime_ns=0), bytes(32))
+                self.assertLessEqual(len(index), 200)
+            # evicting makes room for 1% more before the index is counted again
+            self.assertGreaterEqual(len(index), 198)
+
+    def testLookupDoesNotWrite(self):
+        """recency updates are held back until TOUCH_BATCH lookups, an eviction or close"""
+        def used():
+            with contextlib.closing(sqlite3.connect(self.index_path)) as connection:
+                return connection.execute("SELECT used FROM digests").fetchone()[0]
+        index = sha256index.DigestIndex(self.index_path)
+        index.digest(self.paths[0])
+        stored = used()
+        index.digest(self.paths[0])
+        self.assertEqual(used(), stored)
+        index.close()
+        self.assertGreater(used(), stored)
+
+    def testSharedByWorkers(self):
+        """worker processes of hash_tree share one index"""
+        root = os.path.join(self.directory.name, "tree")
+        os.mkdir(root)
+        for i in range(20):
+            with open(os.path.join(root, str(i)), "wb") as f:
+                f.write(bytes([i]) * 100)
+        expected, _ = sha256manifest.hash_tree(root, workers=1)
+        for _ in range(2):
+            digests, errors = sha256manifest.hash_tree(root, workers=2, index_path=self.index_path, batch_files=3)
+            self.assertEqual((digests, errors), (expected, {}))
+        with sha256index.DigestIndex(self.index_path) as index:
+            self.assertEqual(len(index), 20)
+
+
+class HMACTestCase(unittest.TestCase):
+    """Test HMAC-SHA256 and PBKDF2-HMAC-SHA256 against the hmac and hashlib modules"""
+
+    def testHMAC(self):
+        # keys shorter than, equal to and longer than a block
+        for key in (b"", b"key", b"k" * 64, b"long key" * 20):
+            for msg in (b"", b"The quick brown fox jumps over the lazy dog", bytes(range(256))):
+                self.assertEqual(sha256hmac.hmac_sha256(key, msg), hmac.new(key, msg, "sha256").digest())
+
+    def testUpdateAndCopy(self):
+        test = sha256hmac.new(b"key", b"hello")
+        fork = test.copy()
+        fork.update(b" there")
+        test.update(b" world")
+        self.assertEqual(test.hexdigest(), hmac.new(b"key", b"hello world", "sha256").hexdigest())
+        self.assertEqual(fork.hexdigest(), hmac.new(b"key", b"hello there", "sha256").hexdigest())
+
+    def testPBKDF2(self):
+        # output lengths of less than one, one, and several blocks, and a salt longer than a block
+        for password, salt, iterations, dklen in ((b"password", b"salt", 1, None), (b"password", b"salt", 2, 20),
+                                                  (b"p" * 100, b"NaCl", 50, 64), (b"", b"", 3, 70),
+                                                  (b"password", b"salt" * 30, 2, 40)):
+            self.assertEqual(sha256hmac.pbkdf2_hmac(password, salt, iterations, dklen),
+                             hashlib.pbkdf2_hmac("sha256", password, salt, iterations, dklen))
+        self.assertRaises(ValueError, sha256hmac.pbkdf2_hmac, b"password", b"salt", 0)
+        # like hashlib, a zero or negative key length is an error, not the default length
+        for dklen in (0, -1):
+            self.assertRaises(ValueError, hashlib.pbkdf2_hmac, "sha256", b"password", b"salt", 1, dklen)
+            self.assertRaises(ValueError, sha256hmac.pbkdf2_hmac, b"password", b"salt", 1, dklen)
+
+
+class NonceSearchTestCase(unittest.TestCase):
+    """Test the double SHA-256 nonce search against hashlib"""
+
+    def setUp(self):
+        self.header = bytes(random.randrange(256) for _ in range(80))
+
+    def doubleSHA256(self, nonce):
+        return hashlib.sha256(hashlib.sha256(self.header[:76] + struct.pack("<I", nonce)).digest()).digest()
+
+    def testDoubleSHA256(self):
+        self.assertEqual(sha256pow.double_sha256(self.header), hashlib.sha256(hashlib.sha256(self.header).digest())
+                         .digest())
+
+    def testSearch(self):
+        # about 1 in 16 nonces meets this target, the first one found by a single worker is the smallest
+        target = 2 ** 252
+        result = sha256pow.search(self.header, target, workers=1)
+        self.assertEqual(result.digest, self.doubleSHA256(result.nonce))
+        self.assertLessEqual(int.from_bytes(result.digest, "little"), target)
+        for nonce in range(result.nonce):
+            self.assertGreater(int.from_bytes(self.doubleSHA256(nonce), "little"), target)
+        self.assertEqual(result.hashes, result.nonce + 1)
+
+    def testSearchWorkers(self):
+        target = 2 ** 250
+        result = sha256pow.search(self.header, target, workers=2, chunk_size=16)
+        self.assertEqual(result.digest, self.doubleSHA256(result.nonce))
+        self.assertLessEqual(int.from_bytes(result.digest, "little"), target)
+
+    def testSearchCancelsPending(self):
+        # many small chunks in flight when the first solution comes back, most of them cancelled before they run
+        target = (1 << 256) >> 6
+        result = sha256pow.search(self.header, target, workers=8, chunk_size=64)
+        self.assertEqual(result.digest, self.doubleSHA256(result.nonce))
+        self.assertLessEqual(int.from_bytes(result.digest, "little"), target)
+
+    def testNoSolution(self):
+        result = sha256pow.search(self.header, 0, start=10, end=60, workers=2, chunk_size=16)
+        self.assertIsNone(result.nonce)
+        self.assertEqual(result.hashes, 50)
+        self.assertGreater(result.hashes_per_second, 0)
+
+
+class AsyncTestCase(unittest.TestCase):
+    """Test the asyncio hashing helpers"""
+
+    def setUp(self):
+        self.data = bytes(random.randrange(256) for _ in range(5000))
+
+    async def chunks(self, size):
+        for offset in range(0, len(self.data), size):
+            yield self.data[offset:offset + size]
+            await asyncio.sleep(0)
+
+    def testHashReader(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(self.data)
+            reader.feed_eof()
+            return await sha256async.hash_reader(reader, read_size=700)
+        self.assertEqual(asyncio.run(run()).hexdigest(), hashlib.sha256(self.data).hexdigest())
+
+    def testHashChunks(self):
+        # small chunks are hashed inline, large ones in the executor
+        for size in (10, 2000):
+            hasher = asyncio.run(sha256async.hash_chunks(self.chunks(size)))
+            self.assertEqual(hasher.hexdigest(), hashlib.sha256(self.data).hexdigest())
+
+    def testBoundedInFlight(self):
+        async def run():
+            hasher = sha256async.AsyncHasher(max_concurrent=2)
+            most = 0
+
+            async def watch():
+                nonlocal most
+                while True:
+                    most = max(most, hasher.in_flight)
+                    await asyncio.sleep(0)
+            watcher = asyncio.create_task(watch())
+            results = await asyncio.gather(*(hasher.hash_bytes(self.data[:i * 500]) for i in range(6)))
+            watcher.cancel()
+            return results, most
+        results, most = asyncio.run(run())
+        self.assertEqual([result.hexdigest() for result in results],
+                         [hashlib.sha256(self.data[:i * 500]).hexdigest() for i in range(6)])
+        self.assertEqual(most, 2)
+
+    def testProcessPool(self):
+        """hash_bytes sends memoryview slices, they go to worker processes as bytes"""
+        async def run(executor):
+            return await sha256async.AsyncHasher(executor=executor).hash_bytes(data)
+        data = self.data * 30
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            self.assertEqual(asyncio.run(run(executor)).hexdigest(), hashlib.sha256(data).hexdigest())
+
+
+class HashFileTestCase(unittest.TestCase):
+    """Test file hashing and the sha256sum compatible command line"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.files = {}
+        for name, length in (("empty", 0), ("small.txt", 11), ("large.bin", 5000)):
+            data = bytes(random.randrange(256) for _ in range(length))
+            self.files[os.path.join(self.directory.name, name)] = data
+            with open(os.path.join(self.directory.name, name), "wb") as f:
+                f.write(data)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testHashFile(self):
+        # small chunk sizes make both the mmap and the readinto paths feed many windows
+        for path, data in self.files.items():
+            for chunk_size in (64, 100, CHUNK_SIZE):
+                self.assertEqual(hash_file(path, chunk_size).hexdigest(), hashlib.sha256(data).hexdigest())
+            with open(path, "rb") as f:
+                self.assertEqual(hash_stream(f, 100).hexdigest(), hashlib.sha256(data).hexdigest())
+
+    def testMainAndCheck(self):
+        """output is in sha256sum format and can be checked with --check"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(main(list(self.files)), 0)
+        expected = ''.join(f"{hashlib.sha256(data).hexdigest()}  {path}\n" for path, data in self.files.items())
+        self.assertEqual(output.getvalue(), expected)
+        checksum_file = os.path.join(self.directory.name, "SHA256SUMS")
+        with open(checksum_file, "w") as f:
+            f.write(expected)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(main(["--check", checksum_file]), 0)
+        self.assertEqual(output.getvalue(), ''.join(f"{path}: OK\n" for path in self.files))
+        # change one file, the check should now fail for that file only
+        with open(list(self.files)[1], "ab") as f:
+            f.write(b"!")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(main(["--check", checksum_file]), 1)
+        self.assertIn(f"{list(self.files)[1]}: FAILED\n", output.getvalue())
+
+
+class SharedMemoryTestCase(unittest.TestCase):
+    """Test hashing buffers through shared memory in worker processes"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = sha256shm.SharedMemoryPool(workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def testHashBuffers(self):
+        buffers = [bytes(random.randrange(256) for _ in range(length)) for length in (0, 1, 64, 1000, 5000)]
+        buffers += [bytearray(b"abc"), array.array("I", range(100))]
+        self.assertEqual(self.pool.hash_buffers(buffers), [hashlib.sha256(buffer).digest() for buffer in buffers])
+        self.assertEqual(self.pool.hash_buffers([]), [])
+
+    def testSegment(self):
+        """segments are filled in place, and unlinked when the block exits, even on errors"""
+        with self.assertRaises(KeyError):
+            with self.pool.segment(6) as segment:
+                segment.buf[:6] = b"abcdef"
+                self.assertEqual(self.pool.hash_segment(segment, [(0, 3), (3, 3)]),
+                                 [hashlib.sha256(b"abc").digest(), hashlib.sha256(b"def").digest()])
+                name = segment.name
+                raise KeyError
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+        self.assertEqual(self.pool._segments, {})
+
+    def testClose(self):
+        """close unlinks the segments still open"""
+        pool = sha256shm.SharedMemoryPool(workers=1)
+        segment = pool.create_segment(100)
+        pool.close()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=segment.name)
+
+
+class ManifestTestCase(unittest.TestCase):
+    """Test directory tree hashing, manifest generation and verification"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        self.files = {}
+        for path, length in (("a.txt", 11), ("b/c.bin", 300), ("b/d/e", 0), ("b/d/f", 70000), ("g", 5)):
+            data = bytes(random.randrange(256) for _ in range(length))
+            os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+            with open(os.path.join(self.root, path), "wb") as f:
+                f.write(data)
+            self.files[path] = hashlib.sha256(data).hexdigest()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testPlanTasks(self):
+        """large files get their own task, small files are batched"""
+        files = [("big", 100), ("s1", 1), ("s2", 1), ("s3", 1), ("s4", 49)]
+        self.assertEqual(sha256manifest.plan_tasks(files, batch_bytes=50, batch_files=2),
+                         [["big"], ["s1", "s2"], ["s3", "s4"]])
+
+    def testHashTree(self):
+        for workers in (1, 2):
+            digests, errors = sha256manifest.hash_tree(self.root, workers=workers, batch_files=2)
+            self.assertEqual(digests, self.files)
+            self.assertEqual(list(digests), sorted(self.files))
+            self.assertEqual(errors, {})
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "requires os.symlink")
+    def testSymlinksSkipped(self):
+        """links to a directory, to a file and to nothing are neither listed, followed nor hashed"""
+        try:
+            os.symlink("b", os.path.join(self.root, "link_dir"), target_is_directory=True)
+            os.symlink("a.txt", os.path.join(self.root, "link_file"))
+            os.symlink("missing", os.path.join(self.root, "b/link_broken"))
+        except OSError as e:
+            self.skipTest(f"can't create symlinks: {e}")
+        self.assertEqual([path for path, _ in sha256manifest.walk_files(self.root)], sorted(self.files))
+        self.assertEqual(sha256manifest.hash_tree(self.root, workers=1), (self.files, {}))
+        manifest = os.path.join(self.root, "MANIFEST")
+        self.assertEqual(sha256manifest.write_manifest(self.root, manifest, workers=1), {})
+        self.assertTrue(sha256manifest.verify_manifest(self.root, manifest, workers=1).ok)
+
+    def testManifest(self):
+        manifest = os.path.join(self.root, "MANIFEST")
+        self.assertEqual(sha256manifest.write_manifest(self.root, manifest, workers=2), {})
+        self.assertEqual(sha256manifest.read_manifest(manifest), self.files)
+        report = sha256manifest.verify_manifest(self.root, manifest, workers=2)
+        self.assertTrue(report.ok)
+        self.assertEqual(report.lines(), [f"{path}: OK" for path in sorted(self.files)])
+        # change, remove and add a file
+        with open(os.path.join(self.root, "a.txt"), "ab") as f:
+            f.write(b"!")
+        os.remove(os.path.join(self.root, "g"))
+        with open(os.path.join(self.root, "b/new"), "wb") as f:
+            f.write(b"new")
+        report = sha256manifest.verify_manifest(self.root, manifest, workers=2)
+        self.assertFalse(report.ok)
+        self.assertEqual(report.mismatched, ["a.txt"])
+        self.assertEqual(list(report.errors), ["g"])
+        self.assertEqual(report.extra, ["b/new"])
+
+    def testManifestInsideRoot(self):
+        """creating the manifest again does not list the previous manifest in the new one"""
+        manifest = os.path.join(self.root, "MANIFEST")
+        for _ in range(2):
+            with contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(sha256manifest.main(["-j", "1", "create", self.root, "-o", manifest]), 0)
+        self.assertEqual(sha256manifest.read_manifest(manifest), self.files)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(sha256manifest.main(["-j", "1", "verify", self.root, manifest]), 0)
+
+
+class TreeHashTestCase(unittest.TestCase):
+    """Test the tree-hash mode against the documented format, computed here with hashlib"""
+
+    @staticmethod
+    def reference(data, leaf_size, fanout):
+        level = [hashlib.sha256(b"\x00" + data[i:i + leaf_size]).digest()
+                 for i in range(0, max(len(data), 1), leaf_size)]
+        while len(level) > 1:
+            level = [hashlib.sha256(b"\x01" + b"".join(level[i:i + fanout])).digest()
+                     for i in range(0, len(level), fanout)]
+        return hashlib.sha256(b"\x02sha256tree" + struct.pack(">BQIQ", 1, leaf_size, fanout, len(data)) +
+                              level[0]).digest()
+
+    def testTreeHash(self):
+        # 0, 1 and several leaves, with partial last leaves and levels with partial nodes
+        for length in (0, 1, 64, 100, 1000, 4097):
+            data = bytes(random.randrange(256) for _ in range(length))
+            for leaf_size, fanout in ((64, 2), (100, 3), (1024, 16)):
+                self.assertEqual(sha256treehash.tree_hash(data, leaf_size, fanout),
+                                 self.reference(data, leaf_size, fanout))
+
+    def testTreeHashFile(self):
+        """leaves hashed in worker processes give the same root as the in-process tree hash"""
+        data = bytes(random.randrange(256) for _ in range(20000))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data")
+            with open(path, "wb") as f:
+                f.write(data)
+            for workers in (1, 2):
+                self.assertEqual(sha256treehash.tree_hash_file(path, 512, 4, workers),
+                                 sha256treehash.tree_hash(data, 512, 4))
+            open(path, "wb").close()
+            self.assertEqual(sha256treehash.tree_hash_file(path, 512, 4, 2), sha256treehash.tree_hash(b"", 512, 4))
+
+    def testParametersChangeRoot(self):
+        data = b"a" * 1000
+        roots = {sha256treehash.tree_hash(data, leaf_size, fanout) for leaf_size, fanout in ((64, 2), (64, 3),
+                                                                                              (128, 2))}
+        self.assertEqual(len(roots), 3)
+        self.assertRaises(ValueError, sha256treehash.tree_hash, data, 64, 1)
+
+
+class MerkleTestCase(unittest.TestCase):
+    """Test the incremental Merkle index against the tree hash of the whole file"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "data")
+        # random data with a run of zero pages
+        data = random.Random(2).randbytes(6000) + bytes(5000) + random.Random(3).randbytes(3000)
+        with open(self.path, "wb") as f:
+            f.write(data)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def index(self):
+        return sha256merkle.MerkleIndex(self.path, leaf_size=256, fanout=4)
+
+    def expected(self):
+        return sha256treehash.tree_hash_file(self.path, leaf_size=256, fanout=4, workers=1)
+
+    def write(self, offset, data):
+        with open(self.path, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+
+    def testBuild(self):
+        with self.index() as index:
+            self.assertTrue(index.created)
+            self.assertEqual(index.root(), self.expected())
+            # 55 leaves, of which 18 are zero pages hashed once
+            self.assertEqual(index.leaves_hashed, 55 - 18 + 1)
+
+    def testChangeList(self):
+        with self.index() as index:
+            self.write(1000, b"abc")
+            self.write(7000, b"x" * 300)
+            self.assertEqual(index.update([(1000, 3), (7000, 300)]), 3)
+            # one node per level above each changed leaf, the two paths meet below the top
+            self.assertLessEqual(index.nodes_hashed, 8)
+            self.assertEqual(index.root(), self.expected())
+            self.assertEqual(index.update([]), 0)
+
+    def testScan(self):
+        with self.index() as index:
+            self.write(13000, b"changed")
+            self.assertEqual(index.update(), 1)
+            self.assertEqual(index.root(), self.expected())
+
+    def testLengthChange(self):
+        with self.index() as index:
+            with open(self.path, "ab") as f:
+                f.write(b"appended")
+            # the old partial last leaf and the new one
+            self.assertEqual(index.update(), 1)
+            self.assertEqual(index.root(), self.expected())
+            os.truncate(self.path, 100)
+            index.update()
+            self.assertEqual(index.root(), self.expected())
+            os.truncate(self.path, 0)
+            index.update()
+            self.assertEqual(index.root(), self.expected())
+
+    def testPersisted(self):
+        with self.index() as index:
+            root = index.root()
+        with self.index() as index:
+            self.assertFalse(index.created)
+            self.assertEqual(index.root(), root)
+        # an index with other parameters is rebuilt
+        with sha256merkle.MerkleIndex(self.path, leaf_size=512, fanout=4) as index:
+            self.assertTrue(index.created)
+            self.assertEqual(index.root(), sha256treehash.tree_hash_file(self.path, 512, 4, workers=1))
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    """Test the benchmark suite's measurements and baseline comparison (on tiny sizes so it stays fast)"""
+
+    def testThroughput(self):
+        results = sha256bench.benchmark_throughput(["SHA256Int", "hashlib.sha256"], [0, 64], min_time=0.01, repeat=2)
+        self.assertEqual(set(results), {"SHA256Int", "hashlib.sha256"})
+        for sizes in results.values():
+            self.assertEqual(set(sizes), {0, 64})
+            self.assertGreater(sizes[64]["ns_per_hash"], 0)
+            self.assertGreater(sizes[64]["mb_per_s"], 0)
+
+    def testBudgetSkipsLargeSizes(self):
+        skipped = []
+        results = sha256bench.benchmark_throughput(["SHA256"], [0, 1 << 20], budget=1, min_time=0.01, repeat=1,
+                                                   progress=lambda engine, size, result: result or skipped.append(size))
+        self.assertEqual(list(results["SHA256"]), [0])
+        self.assertEqual(skipped, [1 << 20])
+
+    def testBaseline(self):
+        results = {"SHA256Int": {64: {"ns_per_hash": 100.0, "mb_per_s": 0.64}}}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            sha256bench.save_baseline(path, results)
+            with open(path) as f:
+                baseline = json.load(f)
+        self.assertEqual(sha256bench.compare_results(results, baseline), [])
+        slower = {"SHA256Int": {64: {"ns_per_hash": 125.0, "mb_per_s": 0.512}, 128: {"ns_per_hash": 1.0,
+                                                                                     "mb_per_s": 128.0}}}
+        self.assertEqual(sha256bench.compare_results(slower, baseline, threshold=0.3), [])
+        self.assertEqual(sha256bench.compare_results(slower, baseline, threshold=0.2), [("SHA256Int", 64, 0.25)])
+
+
 class SHA256PerformanceTestCase(unittest.TestCase):
     """Performance tests for my SHA256 class, hashlib SHA256, and hashlib SHA256"""
 
@@ -159,7 +1265,22 @@ class SHA256PerformanceTestCase(unittest.TestCase):
             duration = timeit.timeit(lambda: test.generate_hash(), number=length)
             print(f"n={length}: {duration}")
 
-    def testPerformanceSHA256(self):
+    def testPerformanceSHA256Int(self):
+        """compare the integer engine against my SHA-256 class for length 20 strings"""
+        test_str = ''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in
+                           range(20))
+        print("Performance Tests for SHA256Int")
+        test = SHA256Int(test_str)
+        for length in itertools.chain([10, 100, 500], range(1000, 2500, 500)):
+            duration = timeit.timeit(lambda: test.generate_hash(), number=length)
+            print(f"n={length}: {duration}")
+        # SHA256Int must be at least 100x faster than the SHA256 class (python sha256bench.py int)
+        results = sha256bench.benchmark_int_engine(number=5, repeat=10)
+        speedup = results["SHA256"] / results["SHA256Int"]
+        print(f"SHA256: {results['SHA256']}, SHA256Int: {results['SHA256Int']}, speedup: {speedup:.0f}x")
+        self.assertGreaterEqual(speedup, 100)
+
+    def testPerformanceSHA256Short(self):
         """test performance times for hashlib sha-256 for length 20 strings"""
         # generate test_str of length 20
         test_str = ''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in
@@ -171,7 +1292,7 @@ class SHA256PerformanceTestCase(unittest.TestCase):
             n *= 4
             print(f"n={n}: {duration}")
 
-    def testPerformance512(self):
+    def testPerformance512Short(self):
         """test performance times for hashlib sha-512 for length 20 strings"""
         # generate test_str of length 20 strings
         test_str = ''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in
@@ -185,11 +1306,10 @@ class SHA256PerformanceTestCase(unittest.TestCase):
             print(f"n={n}: {duration}")
 
 
-    def testPerformanceSHA256(self):
+    def testPerformanceSHA256Long(self):
         """test performance times for hashlib sha-256 for length 10000000 strings"""
         # generate test_str of length 10000000 strings
-        test_str = ''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in
-                           range(10000000))
+        test_str = ''.join(random.choices(ascii_uppercase + digits + ascii_lowercase, k=10000000))
         print("Performance Tests for SHA-256 length 10000000 string")
         n = 10
         while n < 4000:
@@ -197,11 +1317,10 @@ class SHA256PerformanceTestCase(unittest.TestCase):
             print(f"n={n}: {duration}")
             n *= 4
 
-    def testPerformance512(self):
+    def testPerformance512Long(self):
         """test performance times for hashlib sha-512 for length 10000000 strings"""
         # generate test_str of length 10000000 strings
-        test_str = ''.join(random.choice(ascii_uppercase + digits + ascii_lowercase) for _ in
-                           range(10000000))
+        test_str = ''.join(random.choices(ascii_uppercase + digits + ascii_lowercase, k=10000000))
         print("Performance Tests for SHA-512 length 10000000 string ")
         test = SHA256(test_str)
         n = 10
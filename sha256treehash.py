@@ -0,0 +1,139 @@
+'''
+Opt-in parallel tree-hash mode for very large inputs, built on sha256.SHA256Hash.
+
+Standard SHA-256 is sequential across blocks, so a single large file can only use one core.  The tree hash splits the
+input into fixed-size leaves that are hashed independently (in worker processes), then combines them in a tree.  The
+result is NOT the SHA-256 of the input: it is a different digest that only matches other tree hashes made with the
+same format version, leaf size and fan-out.
+
+Format, version 1 (H is SHA-256, || is concatenation, integers are big-endian):
+    leaves:   the input is split into leaf_size byte leaves, the last one may be shorter.  An empty input is one
+              empty leaf.
+    leaf:     L = H(0x00 || leaf bytes)
+    interior: N = H(0x01 || child_1 || ... || child_k), children are the previous level's digests taken fanout at a
+              time in order (the last node of a level may have fewer than fanout children).  Levels are built until a
+              single digest T remains (with a single leaf, T is that leaf's L).
+    root:     H(0x02 || b'sha256tree' || version (1 byte) || leaf_size (8 bytes) || fanout (4 bytes) ||
+              input length in bytes (8 bytes) || T)
+The 0x00/0x01/0x02 prefixes separate leaf, interior and root domains, and the root binds the parameters and length.
+
+Run with: python sha256treehash.py [--leaf-size BYTES] [--fanout N] [-j WORKERS] FILE...
+'''
+
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from sha256 import SHA256Hash
+
+TREE_VERSION = 1
+LEAF_SIZE = 1 << 20
+FANOUT = 16
+LEAF_PREFIX = b'\x00'
+INTERIOR_PREFIX = b'\x01'
+ROOT_PREFIX = b'\x02sha256tree'
+# each worker task hashes a run of consecutive leaves, about this many tasks per worker balances the load
+TASKS_PER_WORKER = 4
+
+
+def check_params(leaf_size, fanout):
+    """Raise ValueError unless leaf_size and fanout describe a valid tree"""
+    if leaf_size < 1:
+        raise ValueError('leaf_size must be at least 1 byte')
+    if fanout < 2:
+        raise ValueError('fanout must be at least 2')
+
+
+def leaf_count(length, leaf_size):
+    """Number of leaves for an input of length bytes (an empty input is one empty leaf)"""
+    return max(1, -(-length // leaf_size))
+
+
+def leaf_digests(view, start, end, leaf_size):
+    """Return the leaf digests of leaves start...end-1 of the buffer view"""
+    digests = []
+    for i in range(start, end):
+        leaf = SHA256Hash(LEAF_PREFIX)
+        leaf.update(view[i * leaf_size:(i + 1) * leaf_size])
+        digests.append(leaf.digest())
+    return digests
+
+
+def combine(digests, length, leaf_size=LEAF_SIZE, fanout=FANOUT):
+    """Build the interior levels over the leaf digests and return the 32 byte root digest"""
+    check_params(leaf_size, fanout)
+    level = list(digests)
+    while len(level) > 1:
+        level = [SHA256Hash(INTERIOR_PREFIX + b''.join(level[i:i + fanout])).digest()
+                 for i in range(0, len(level), fanout)]
+    root = SHA256Hash(ROOT_PREFIX + struct.pack('>BQIQ', TREE_VERSION, leaf_size, fanout, length))
+    root.update(level[0])
+    return root.digest()
+
+
+def tree_hash(data, leaf_size=LEAF_SIZE, fanout=FANOUT):
+    """Tree hash of bytes-like data, computed in this process.  Returns the 32 byte root digest"""
+    check_params(leaf_size, fanout)
+    with memoryview(data).cast('B') as view:
+        digests = leaf_digests(view, 0, leaf_count(len(view), leaf_size), leaf_size)
+        return combine(digests, len(view), leaf_size, fanout)
+
+
+def hash_file_leaves(path, start, end, leaf_size):
+    """Worker task: memory-map the file at path and return the digests of leaves start...end-1"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return leaf_digests(b'', start, end, leaf_size)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return leaf_digests(view, start, end, leaf_size)
+
+
+def tree_hash_file(path, leaf_size=LEAF_SIZE, fanout=FANOUT, workers=None):
+    """
+    Tree hash of the file at path with the leaves hashed in a pool of worker processes (default: one per CPU, with
+    workers=1 everything runs in this process).  Each worker maps the file itself, so no file data is sent between
+    processes, only 32 byte leaf digests come back.  Returns the 32 byte root digest.
+    """
+    check_params(leaf_size, fanout)
+    length = os.stat(path).st_size
+    count = leaf_count(length, leaf_size)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return combine(hash_file_leaves(path, 0, count, leaf_size), length, leaf_size, fanout)
+    # split the leaves into runs of consecutive leaves, a few runs per worker
+    step = -(-count // (workers * TASKS_PER_WORKER))
+    starts = list(range(0, count, step))
+    ends = [min(start + step, count) for start in starts]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        runs = executor.map(hash_file_leaves, [path] * len(starts), starts, ends, [leaf_size] * len(starts))
+        digests = [digest for run in runs for digest in run]
+    return combine(digests, length, leaf_size, fanout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sha256treehash', description=f'Print tree hashes (format version '
+                                                                        f'{TREE_VERSION}) of files.')
+    parser.add_argument('files', nargs='+', metavar='FILE')
+    parser.add_argument('--leaf-size', type=int, default=LEAF_SIZE, help=f'leaf size in bytes (default: {LEAF_SIZE})')
+    parser.add_argument('--fanout', type=int, default=FANOUT, help=f'children per interior node (default: {FANOUT})')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: CPUs)')
+    args = parser.parse_args(argv)
+    status = 0
+    for name in args.files:
+        try:
+            digest = tree_hash_file(name, args.leaf_size, args.fanout, args.workers)
+        except OSError as error:
+            print(f"sha256treehash: {name}: {error.strerror}", file=sys.stderr)
+            status = 1
+            continue
+        print(f"{digest.hex()}  {name}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+'''
+Fully unrolled compression function, generated as Python source when the module is imported.
+
+sha256.compress runs the message schedule and the 64 rounds as loops over lists, shuffling the 8 working variables
+after every round.  generate_source() instead writes out all 64 rounds as straight-line code using local variables
+only: the schedule words w16...w63 are computed just before the round that needs them, the round constants are
+inlined as literals, and rather than shuffling a...h each round uses the variables under rotated names (after 8
+rounds the names are back where they started).  maj(a, b, c) is computed as b ^ ((a ^ b) & (b ^ c)): the b ^ c of a
+round is the a ^ b of the round before, so it costs 3 operations instead of 4.  The source is compiled once with
+compile(), and the code object is cached on disk (marshal, in __pycache__ next to this file) so later imports skip
+code generation.  Set the environment variable SHA256_UNROLLED_CACHE to another directory, or to an empty string to
+disable the disk cache.
+'''
+
+
+import marshal
+import os
+import struct
+import sys
+import zlib
+
+from sha256 import HASH_VALUES, ROUND_CONSTANTS, SHA256Int
+
+# bump when generate_source changes, so stale cached code objects are not loaded
+GENERATOR_VERSION = 3
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+NAMES = 'abcdefgh'
+
+
+def generate_source(k=ROUND_CONSTANTS):
+    """Return the Python source of the unrolled compress(state, words) function for round constants k"""
+    lines = [
+        'def compress(state, words):',
+        '    """Unrolled SHA-256 compression of one block: 8 hash values and 16 message words in, 8 hash values out"""',
+        '    ' + ', '.join(f'w{i}' for i in range(16)) + ' = words',
+        '    h0, h1, h2, h3, h4, h5, h6, h7 = state',
+        '    a, b, c, d, e, f, g, h = state',
+        '    m = b ^ c',
+    ]
+    for i in range(64):
+        if i >= 16:
+            # w[i] = w[i-16] + sigma_0(w[i-15]) + w[i-7] + sigma_1(w[i-2]), rotations on words doubled to 64 bits
+            lines += [
+                f'    x = w{i - 15} * 0x100000001',
+                f'    y = w{i - 2} * 0x100000001',
+                f'    w{i} = (w{i - 16} + ((x >> 7) ^ (x >> 18) ^ (w{i - 15} >> 3)) + w{i - 7}'
+                f' + ((y >> 17) ^ (y >> 19) ^ (w{i - 2} >> 10))) & 0xffffffff',
+            ]
+        # round i sees the working variables rotated right by i: its h is the variable that becomes the new a, and
+        # its d becomes the new e, so no values move between variables
+        a, b, c, d, e, f, g, h = (NAMES[(j - i) % 8] for j in range(8))
+        m, n = ('m', 'n') if i % 2 == 0 else ('n', 'm')
+        lines += [
+            f'    # round {i}',
+            f'    x = {e} * 0x100000001',
+            f'    t = {h} + ((x >> 6) ^ (x >> 11) ^ (x >> 25)) + ({g} ^ ({e} & ({f} ^ {g}))) + {k[i]:#010x} + w{i}',
+            f'    {d} = ({d} + t) & 0xffffffff',
+            f'    x = {a} * 0x100000001',
+            # maj = b ^ ((a ^ b) & (b ^ c)): one of m and n holds the b ^ c of this round (the a ^ b of the last
+            # one), the other receives this round's a ^ b, and they swap roles every round instead of copying
+            f'    {n} = {a} ^ {b}',
+            f'    {h} = (t + ((x >> 2) ^ (x >> 13) ^ (x >> 22)) + ({b} ^ ({n} & {m}))) & 0xffffffff',
+        ]
+    lines.append('    return [' + ', '.join(f'(h{j} + {NAMES[j]}) & 0xffffffff' for j in range(8)) + ']')
+    return '\n'.join(lines) + '\n'
+
+
+def cache_path(cache_dir, k=ROUND_CONSTANTS):
+    """Cache file for the code object: keyed by interpreter, generator version and round constants"""
+    key = zlib.crc32(struct.pack(f'>{len(k)}I', *k))
+    return os.path.join(cache_dir, f'sha256unrolled.{sys.implementation.cache_tag}.v{GENERATOR_VERSION}.{key:08x}'
+                                   f'.marshal')
+
+
+def build(k=ROUND_CONSTANTS, cache_dir=None):
+    """
+    Return the compiled unrolled compress function, loading its code object from cache_dir if it was cached there
+    and generating, compiling and caching it otherwise (cache_dir None: no disk cache)
+    """
+    code = None
+    path = cache_path(cache_dir, k) if cache_dir else None
+    if path:
+        try:
+            with open(path, 'rb') as f:
+                code = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            code = None
+    if code is None:
+        code = compile(generate_source(k), '<sha256unrolled>', 'exec')
+        if path:
+            # write to a temporary file then rename, so concurrent imports never read a partial file
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                temporary = f'{path}.{os.getpid()}.tmp'
+                with open(temporary, 'wb') as f:
+                    marshal.dump(code, f)
+                os.replace(temporary, path)
+            except OSError:
+                pass
+    namespace = {}
+    exec(code, namespace)
+    return namespace['compress']
+
+
+compress = build(cache_dir=os.environ.get('SHA256_UNROLLED_CACHE', DEFAULT_CACHE_DIR))
+
+
+class SHA256Unrolled(SHA256Int):
+    """SHA256Int using the generated, fully unrolled compression function"""
+
+    def generate_hash(self):
+        h = HASH_VALUES
+        for block in self.preprocessed.message_blocks():
+            h = compress(h, block)
+        return ''.join(format(x, '08x') for x in h)